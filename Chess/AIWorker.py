@@ -0,0 +1,125 @@
+"""
+A long-lived AI process. The GUI sends it the game as a start FEN and a list of move codes, and it answers with move
+codes. Its transposition table, history and game state stay in the process between moves, and only the new moves
+have to be made on its board.
+"""
+import atexit
+import queue
+import time
+from multiprocessing import Process, Queue, Value
+from Chess import ChessEngine, ChessAI
+
+
+class SearchFlag():
+    '''
+    Stands in for an Event in ChessAI.think. counter is a shared Value holding the id of the latest search the GUI
+    stopped (or had a ponder hit for), so a stop meant for one search can't end the next one
+    '''
+    def __init__(self, counter, search_id):
+        self.counter = counter
+        self.search_id = search_id
+
+    def is_set(self):
+        return self.counter.value >= self.search_id
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        return self.is_set()
+
+
+class AIWorker():
+    '''
+    The GUI side of the AI process. go starts a search, get_result picks up its answer without blocking
+    '''
+    def __init__(self):
+        self.commands = Queue()
+        self.results = Queue()
+        self.stopped = Value('i', 0)
+        self.ponder_hits = Value('i', 0)
+        self.search_id = 0
+        # not a daemon, daemonic processes can't start the parallel_search workers. close stops it, at the latest
+        # when the GUI exits
+        self.process = Process(target=run_worker, args=(self.commands, self.results, self.stopped, self.ponder_hits))
+        self.process.start()
+        atexit.register(self.close)
+
+    '''
+    The game to search: fen for the start position (None for the normal one) and the moves played since, as codes
+    '''
+    def set_position(self, fen, moves):
+        self.commands.put(("position", fen, list(moves)))
+
+    '''
+    Search the position. With ponder the search runs until ponder_hit or stop, the time budget starts from the go
+    '''
+    def go(self, move_time=None, clock=None, increment=0, ponder=False):
+        self.search_id += 1
+        self.commands.put(("go", self.search_id, ChessAI.time_budget(move_time, clock, increment), ponder))
+
+    def stop(self):
+        self.stopped.value = self.search_id
+
+    def ponder_hit(self):
+        self.ponder_hits.value = self.search_id
+
+    def new_game(self):
+        self.stop()
+        self.commands.put(("new_game",))
+
+    '''
+    (move code, code of the expected reply or None) once the latest search is done, None until then. Answers of
+    searches that were stopped or superseded are thrown away
+    '''
+    def get_result(self):
+        while True:
+            try:
+                search_id, move, ponder_move = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            if search_id == self.search_id and self.stopped.value < search_id:
+                return move, ponder_move
+
+    def close(self):
+        atexit.unregister(self.close)
+        if self.process.is_alive():
+            self.stop()
+            self.commands.put(("quit",))
+        self.process.join()
+
+
+'''
+The AI process: handle commands until told to quit
+'''
+def run_worker(commands, results, stopped, ponder_hits):
+    gs = ChessEngine.GameState()
+    fen = None
+    moves = []
+    while True:
+        command = commands.get()
+        if command[0] == "position":
+            _, new_fen, new_moves = command
+            common = 0 # moves the old and new games share from the start
+            if new_fen == fen:
+                while common < min(len(moves), len(new_moves)) and moves[common] == new_moves[common]:
+                    common += 1
+                for _ in range(len(moves) - common): # back to where the games part
+                    gs.pop()
+            else:
+                gs = ChessEngine.GameState(new_fen)
+            for code in new_moves[common:]:
+                gs.push(code)
+            fen, moves = new_fen, new_moves
+        elif command[0] == "go":
+            _, search_id, budget, ponder = command
+            stop = SearchFlag(stopped, search_id)
+            if stop.is_set(): # stopped before it started
+                results.put((search_id, None, None))
+                continue
+            result = ChessAI.think(gs, budget, SearchFlag(ponder_hits, search_id) if ponder else None, stop)
+            move, score, ponder_move = result if result is not None else (None, None, None)
+            results.put((search_id, move, ponder_move))
+        elif command[0] == "new_game":
+            ChessAI.new_game()
+        elif command[0] == "quit":
+            ChessAI.shutdown()
+            break
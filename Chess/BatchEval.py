@@ -0,0 +1,113 @@
+"""
+Scores many positions at once with NumPy. A position is a row of 64 piece codes (see PIECES), so N positions are an
+N x 64 integer array and scoring them is one table lookup and one sum over the whole array. The scores are the same
+as ChessAI.score_board_full for positions that are not checkmate (piece codes say nothing about whose turn it is).
+ChessAI.score_board differs from them where a bitbase knows the result of the position.
+
+Run from the repository root to time it:
+    python -m Chess.BatchEval
+"""
+import time
+import numpy as np
+from Chess import ChessEngine
+from Chess.ChessAI import score_table, piece_score
+
+# piece code n is PIECES[n], 0 is an empty square
+PIECES = (ChessEngine.EMPTY,) + ChessEngine.WHITE_PIECES + ChessEngine.BLACK_PIECES
+PIECE_CODES = {piece: code for code, piece in enumerate(PIECES)}
+PROMOTION_CODES = {colour: np.array([PIECE_CODES[piece + '-' + colour] for piece in ChessEngine.PROMOTION_PIECES])
+                   for colour in ('w', 'b')}
+
+'''
+The knight, bishop, rook, queen and pawn tables stacked into one array, laid out as [square][piece code] and
+flattened so a lookup is SCORES[square * len(PIECES) + code]. score_table entries are multiples of 0.5, so they are
+stored doubled as ints and the sums are exact
+'''
+SQUARE_OFFSETS = np.arange(64, dtype=np.uint16) * len(PIECES)
+SCORES = np.array([[0] + [round(score_table[piece][sq] * 2) for piece in PIECES[1:]] for sq in range(64)],
+                  dtype=np.int16).ravel()
+MATERIAL = np.array([0] + [piece_score[piece[0]] * (1 if piece[2] == 'w' else -1) for piece in PIECES[1:]],
+                    dtype=np.int32)
+
+
+def encode(gs):
+    return np.fromiter((PIECE_CODES[piece] for piece in gs.squares), dtype=np.uint8, count=64)
+
+
+def encode_many(game_states):
+    return np.array([[PIECE_CODES[piece] for piece in gs.squares] for gs in game_states], dtype=np.uint8)
+
+
+'''
+score_board_full for every row of boards, an N x 64 array of piece codes. Returns N floats
+'''
+def score_positions(boards):
+    return np.take(SCORES, np.asarray(boards, dtype=np.uint8) + SQUARE_OFFSETS).sum(axis=1, dtype=np.int32) / 2
+
+
+'''
+score_material for every row of boards. Returns N ints
+'''
+def score_materials(boards):
+    return MATERIAL[np.asarray(boards)].sum(axis=1)
+
+
+'''
+The board after each of moves (packed move codes for gs) as one array, built from the current board without making
+the moves
+'''
+def child_boards(gs, moves):
+    codes = np.asarray(moves, dtype=np.int64)
+    rows = np.arange(len(codes))
+    starts = codes & 63
+    ends = (codes >> 6) & 63
+    flags = codes & ChessEngine.FLAG_MASK
+    board = encode(gs)
+    boards = np.repeat(board[np.newaxis, :], len(codes), axis=0)
+    boards[rows, ends] = board[starts]
+    boards[rows, starts] = 0
+
+    promotion = flags == ChessEngine.PROMOTION
+    colour = 'w' if gs.white_to_move else 'b'
+    boards[rows[promotion], ends[promotion]] = PROMOTION_CODES[colour][codes[promotion] >> 14]
+
+    en_passant = flags == ChessEngine.EN_PASSANT # the captured pawn is on the start row and the end column
+    boards[rows[en_passant], (starts[en_passant] & ~7) | (ends[en_passant] & 7)] = 0
+
+    castle = flags == ChessEngine.CASTLE
+    castle_rows, castle_ends = rows[castle], ends[castle]
+    kingside = castle_ends > starts[castle]
+    rook_starts = np.where(kingside, castle_ends + 1, castle_ends - 2)
+    rook_ends = np.where(kingside, castle_ends - 1, castle_ends + 1)
+    boards[castle_rows, rook_ends] = boards[castle_rows, rook_starts]
+    boards[castle_rows, rook_starts] = 0
+    return boards
+
+
+'''
+score_board_full after each of moves, for scoring all the children of a search node in one go
+'''
+def score_children(gs, moves):
+    if len(moves) == 0:
+        return np.zeros(0)
+    return score_positions(child_boards(gs, moves))
+
+
+def main():
+    gs = ChessEngine.GameState("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    boards = np.repeat(encode(gs)[np.newaxis, :], 1000000, axis=0)
+    start = time.perf_counter()
+    score_positions(boards)
+    seconds = time.perf_counter() - start
+    print("score_positions: {} boards in {:.2f}s, {:.0f} boards/s".format(len(boards), seconds, len(boards) / seconds))
+
+    moves = gs.generate_moves([])
+    start = time.perf_counter()
+    for _ in range(10000):
+        score_children(gs, moves)
+    seconds = time.perf_counter() - start
+    print("score_children: {} moves per node, {:.0f} nodes/s".format(len(moves), 10000 / seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Endgame bitbases for king and queen, rook or pawn against a lone king (KQK, KRK, KPK). For every position they say
+whether the side with the piece wins with best play. They are worked out backwards from the mates (retrograde
+analysis), so the search knows the result of these endings however far away the mate is.
+
+A bitbase file holds one bit per position, set if the side with the piece wins. The side with the piece is white in
+the file (black's positions are flipped), and the positions are 64 * 64 * 64 with white to move followed by as many
+with black to move, indexed by the squares of the white king, the piece and the black king. That makes 64 KB a file.
+Files are memory-mapped and only opened the first time a probe needs them, so nothing is loaded until the board is
+down to three pieces.
+
+Run from the repository root to build the files in Chess/bitbases:
+    python -m Chess.Bitbase
+"""
+import mmap
+import os
+import time
+from Chess.ChessEngine import KING_ATTACKS, PAWN_ATTACKS, ROOK_RAYS, BISHOP_RAYS, slider_attacks
+
+PIECES = ('Q', 'R', 'P') # build order, KPK needs the queen and rook files for its promotions
+MAX_PIECES = 3 # kings included
+BITBASE_DIR = os.path.join(os.path.dirname(__file__), "bitbases")
+POSITIONS = 64 * 64 * 64 # per side to move
+WHITE_WINS = 1
+DRAW = 0
+BLACK_WINS = -1
+NEVER = 255 # moves_left of a position the defending side can save by taking the piece or by stalemate
+
+tables = {} # "KQK" etc. to its mapped file, or None if the file isn't there
+
+
+def index(white_king, piece, black_king):
+    return white_king << 12 | piece << 6 | black_king
+
+
+def piece_attacks(piece, sq, occupied):
+    if piece == 'P':
+        return PAWN_ATTACKS['w'][sq]
+    attacks = slider_attacks(sq, occupied, ROOK_RAYS)
+    if piece == 'Q':
+        attacks |= slider_attacks(sq, occupied, BISHOP_RAYS)
+    return attacks
+
+
+def squares(bitboard):
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+'''
+Squares the piece could have come from to reach sq with occupied standing, without capturing
+'''
+def piece_origins(piece, sq, occupied):
+    if piece != 'P':
+        return piece_attacks(piece, sq, occupied) & ~occupied
+    origins = 0
+    if sq < 48 and not occupied >> (sq + 8) & 1: # a pawn never stands on the first rank
+        origins |= 1 << (sq + 8)
+        if 32 <= sq < 40 and not occupied >> (sq + 16) & 1: # double step from the second rank
+            origins |= 1 << (sq + 16)
+    return origins
+
+
+'''
+Work out the bitbase for king and piece against king. promotions maps 'Q' and 'R' to their finished bitbases, which
+KPK needs. Returns (won, lost): won[i] is 1 if white to move wins position i, lost[i] is 1 if black to move loses it
+'''
+def generate(piece, promotions=None):
+    won = bytearray(POSITIONS)
+    lost = bytearray(POSITIONS)
+    moves_left = bytearray(POSITIONS) # black to move: king moves not yet known to lose
+    found = [] # white to move positions found won as i, black to move positions found lost as POSITIONS + i
+
+    for white_king in range(64):
+        for sq in range(64):
+            if sq == white_king or (piece == 'P' and not 8 <= sq < 56):
+                continue
+            for black_king in range(64):
+                if black_king in (white_king, sq) or KING_ATTACKS[white_king] >> black_king & 1:
+                    continue
+                occupied = 1 << white_king | 1 << sq | 1 << black_king
+                i = index(white_king, sq, black_king)
+                # a king in check can't step back along the line it is checked on, so the attacks look through it
+                guarded = KING_ATTACKS[white_king] | piece_attacks(piece, sq, occupied ^ 1 << black_king)
+                escapes = KING_ATTACKS[black_king] & ~guarded
+                if escapes >> sq & 1 or not (escapes or guarded >> black_king & 1): # takes the piece or stalemate
+                    moves_left[i] = NEVER
+                elif escapes:
+                    moves_left[i] = len(list(squares(escapes)))
+                else: # checkmate
+                    lost[i] = 1
+                    found.append(POSITIONS + i)
+                if promotions and 8 <= sq < 16 and not occupied >> (sq - 8) & 1 \
+                        and not piece_attacks(piece, sq, occupied) >> black_king & 1:
+                    promoted = index(white_king, sq - 8, black_king)
+                    if any(table[1][promoted] for table in promotions.values()):
+                        won[i] = 1
+                        found.append(i)
+
+    while found:
+        i = found.pop()
+        if i >= POSITIONS: # black to move loses, so white wins with any move into it
+            i -= POSITIONS
+            white_king, sq, black_king = i >> 12, i >> 6 & 63, i & 63
+            occupied = 1 << white_king | 1 << sq | 1 << black_king
+            for origin in squares(KING_ATTACKS[white_king] & ~occupied & ~KING_ATTACKS[black_king]):
+                before = occupied ^ 1 << white_king | 1 << origin
+                j = index(origin, sq, black_king)
+                if not won[j] and not piece_attacks(piece, sq, before) >> black_king & 1:
+                    won[j] = 1
+                    found.append(j)
+            for origin in squares(piece_origins(piece, sq, occupied)):
+                before = occupied ^ 1 << sq | 1 << origin
+                j = index(white_king, origin, black_king)
+                if not won[j] and not piece_attacks(piece, origin, before) >> black_king & 1:
+                    won[j] = 1
+                    found.append(j)
+        else: # white to move wins, so black moves into it lose unless black has a better one
+            white_king, sq, black_king = i >> 12, i >> 6 & 63, i & 63
+            occupied = 1 << white_king | 1 << sq | 1 << black_king
+            for origin in squares(KING_ATTACKS[black_king] & ~occupied & ~KING_ATTACKS[white_king]):
+                j = index(white_king, sq, origin)
+                if moves_left[j] != NEVER:
+                    moves_left[j] -= 1
+                    if moves_left[j] == 0:
+                        lost[j] = 1
+                        found.append(POSITIONS + j)
+    return won, lost
+
+
+def pack(bits):
+    packed = bytearray(len(bits) // 8)
+    for i in range(len(packed)):
+        byte = 0
+        for bit in range(8):
+            byte |= bits[i * 8 + bit] << bit
+        packed[i] = byte
+    return packed
+
+
+def path(name):
+    return os.path.join(BITBASE_DIR, name + ".bin")
+
+
+'''
+The mapped bitbase file for name ("KQK", "KRK" or "KPK"), opened on first use. None if it hasn't been built
+'''
+def table(name):
+    if name not in tables:
+        tables[name] = None
+        if os.path.exists(path(name)):
+            with open(path(name), "rb") as bitbase:
+                tables[name] = mmap.mmap(bitbase.fileno(), 0, access=mmap.ACCESS_READ)
+    return tables[name]
+
+
+'''
+WHITE_WINS, DRAW or BLACK_WINS for gs with best play, or None if there is no bitbase for it. Positions with more
+than MAX_PIECES pieces should not be passed in
+'''
+def probe(gs):
+    bitboards = gs.bitboards
+    white_king = bitboards['K-w'].bit_length() - 1
+    black_king = bitboards['K-b'].bit_length() - 1
+    rest = (gs.occupied['w'] | gs.occupied['b']) ^ (1 << white_king | 1 << black_king)
+    if not rest or rest & (rest - 1) or gs.currentCastlingRight.index():
+        return None
+    sq = rest.bit_length() - 1
+    piece = gs.squares[sq]
+    if piece[0] not in PIECES:
+        return None
+    bitbase = table("K" + piece[0] + "K")
+    if bitbase is None:
+        return None
+    stronger_to_move = gs.white_to_move
+    if piece[2] == 'b': # flip the board so the piece is white
+        white_king, sq, black_king = black_king ^ 56, sq ^ 56, white_king ^ 56
+        stronger_to_move = not stronger_to_move
+    i = index(white_king, sq, black_king) + (0 if stronger_to_move else POSITIONS)
+    if not bitbase[i >> 3] >> (i & 7) & 1:
+        return DRAW
+    return WHITE_WINS if piece[2] == 'w' else BLACK_WINS
+
+
+def main():
+    os.makedirs(BITBASE_DIR, exist_ok=True)
+    finished = {}
+    for piece in PIECES:
+        start = time.perf_counter()
+        won, lost = generate(piece, finished if piece == 'P' else None)
+        name = "K" + piece + "K"
+        with open(path(name), "wb") as bitbase:
+            bitbase.write(pack(won) + pack(lost))
+        finished[piece] = (won, lost)
+        tables.pop(name, None)
+        print("{}: {} won with white to move, {} lost with black to move, {:.1f}s".format(
+            name, sum(won), sum(lost), time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,14 @@
+import ast
+import math
+import os
+import queue
 import random
+import time
+from multiprocessing import Process, Queue, Event
+from Chess.ChessEngine import EMPTY, FLAG_MASK, EN_PASSANT, PROMOTION, PROMOTION_PIECES, NULL_MOVE
+from Chess.TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND, NO_MOVE
+from Chess.OpeningBook import OpeningBook
+from Chess import Bitbase
 
 piece_score = {"K": 0, "Q": 10, "R": 5, "B": 3, "N": 3, "P": 1}
 knight_scores = [[1, 1, 1, 1, 1, 1, 1, 1],
@@ -59,9 +69,85 @@ black_pawn_scores = [[0, 0, 0, 0, 0, 0, 0, 0],
 piece_position_scores = {'N': knight_scores, 'Q': queen_scores, 'B': bishop_scores, 'R': rook_scores,
                          "P-w": white_pawn_scores, "P-b": black_pawn_scores}
 
+'''
+What each piece adds to score_board on each square (row * 8 + col): its material plus half its position score,
+positive for white and negative for black. GameState keeps the running total of this in boardScore
+'''
+def make_score_table():
+    table = {}
+    for colour, sign in (('w', 1), ('b', -1)):
+        for piece_type in piece_score:
+            piece = piece_type + '-' + colour
+            if piece_type == 'K': # no position for king
+                position_scores = [[0] * 8 for _ in range(8)]
+            elif piece_type == 'P': # for pawns
+                position_scores = piece_position_scores[piece]
+            else: # for other pieces
+                position_scores = piece_position_scores[piece_type]
+            table[piece] = [sign * (piece_score[piece_type] + position_scores[sq // 8][sq % 8] * 0.5)
+                            for sq in range(64)]
+    return table
+
+score_table = make_score_table()
+
 CHECKMATE = 1000
 STALEMATE = 0
-DEPTH = 3
+DEPTH = 3 # depth for the fixed depth searches
+MAX_DEPTH = 32 # deepest iteration search will start
+MAX_PLY = 128 # deepest the search goes with the quiescence search below the last full depth
+DELTA_MARGIN = 1 # quiescence skips captures whose score right after the capture is this far or more below alpha
+USE_PVS = True # search moves after the first with a zero window first (principal variation search)
+ASPIRATION_WINDOW = 1 # first root window is the last iteration's score plus or minus this, 0 for a full window
+SCORE_STEP = 0.5 # all scores are multiples of this, so (alpha, alpha + SCORE_STEP) is a zero window
+USE_NULL_MOVE = True # let the opponent move twice, if we are still above beta the node is cut off
+NULL_MOVE_REDUCTION = 2 # the null move is searched this much shallower than a normal move
+NULL_MOVE_MIN_DEPTH = 3
+USE_LMR = True # search quiet moves late in the move order less deep (late move reductions)
+LMR_MIN_MOVES = 3 # moves before this in the order are never reduced
+LMR_MIN_DEPTH = 3
+MOVE_TIME = 2.0 # seconds per move when there is no clock
+MOVES_TO_GO = 30 # with a clock, plan to spend the remaining time over this many moves
+TIME_CHECK_NODES = 1024 # look at the clock every this many nodes
+TT_SIZE_MB = 16 # memory cap for the transposition table
+THREADS = 1 # search processes, with more than one they search the same root sharing one table (lazy SMP)
+USE_BOOK = True # play from the opening book while the position is in it
+BOOK_PATH = os.path.join(os.path.dirname(__file__), "book.bin") # build one with python -m Chess.OpeningBook build
+USE_BITBASES = True # look up king and queen, rook or pawn against king in the bitbases (python -m Chess.Bitbase)
+BITBASE_WIN = 500 # score of a won bitbase position before the progress bonus, below any mate the search finds
+
+transposition_table = None # made by the first search, processes that never search don't pay for it
+shared_table = None # the table parallel_search workers share, made on first use and kept between searches
+book = None # the opening book, opened on first use
+# the search generates a node's moves into the list for its ply, so no new lists are made per node
+move_buffers = [[] for _ in range(MAX_PLY + 1)]
+deadline = None # perf_counter time the running search has to stop at, None while searching to depth 1
+stop_event = None # set when the running search is over, for parallel search workers and pondering
+ponder_hit_event = None # while pondering, set once the predicted reply has been played
+ponder_deadline = None # when pondering, the deadline the search gets at the ponder hit
+
+'''
+Move ordering. The hash move goes first, then captures and promotions by MVV-LVA (most valuable victim, then least
+valuable attacker), then the two killer moves of the ply (quiet moves that caused a cutoff in a sibling node), then
+the other quiet moves by their history score (how much they have caused cutoffs anywhere in the tree)
+'''
+HASH_MOVE_ORDER = 1 << 30
+CAPTURE_ORDER = 1 << 29
+KILLER_ORDER = 1 << 28
+attacker_value = dict(piece_score, K=20) # the king counts as the most valuable attacker
+MVV_LVA = {victim: {attacker: 100 * piece_score[victim] - attacker_value[attacker] for attacker in piece_score}
+           for victim in piece_score}
+killers = [[NO_MOVE, NO_MOVE] for _ in range(MAX_PLY + 1)]
+# reduction for the i-th move at a depth, larger for later moves and deeper searches
+lmr_reductions = [[0] + [int(0.75 + math.log(depth) * math.log(i) / 2.25) if depth else 0 for i in range(1, 64)]
+                  for depth in range(MAX_DEPTH + 1)]
+history = {True: [0] * 4096, False: [0] * 4096} # by white_to_move, then start square + 64 * end square
+cutoff_nodes = 0 # nodes that failed high
+first_move_cutoffs = 0 # nodes that failed high on the first move searched
+
+
+class SearchTimeout(Exception):
+    pass
+
 
 def find_random_move(valid_moves):
     return valid_moves[random.randint(0, len(valid_moves) - 1)]
@@ -103,18 +189,321 @@ def find_best_move_no_recursion(gs, valid_moves):
         gs.undo_move()
     return best_player_move
 
-def find_best_move(gs, valid_moves, return_queue):
-    global next_move, counter
+'''
+Seconds to think about one move: move_time if given, otherwise a share of the remaining clock plus most of the
+increment, never more than half of what is left
+'''
+def time_budget(move_time=None, clock=None, increment=0):
+    if move_time is not None:
+        return move_time
+    if clock is None:
+        return MOVE_TIME
+    return min(clock / MOVES_TO_GO + increment * 0.8, clock / 2)
+
+'''
+Search gs for budget seconds and return (best move code, score for the side to move, code of the reply it expects
+or None), or None if stop was set.
+With ponder_hit and stop (Events, or anything with is_set and wait) it ponders: gs is the position after the reply
+expected to the last move, and it is searched with no time limit while the opponent thinks. Once ponder_hit is set
+(the expected reply was played) the time budget applies, counted from the start of pondering, so if the opponent
+took longer than the budget the move comes straight away from the deepest finished depth. If stop is set instead,
+the search is dropped
+'''
+def think(gs, budget, ponder_hit=None, stop=None):
+    global stop_event, ponder_hit_event, ponder_deadline
+    stop_event = stop
+    ponder_hit_event = ponder_hit
+    if ponder_hit is not None:
+        ponder_deadline = time.perf_counter() + budget
+        budget = None
+    root_moves = list(gs.generate_moves([]))
+    random.shuffle(root_moves)
+    best_move, score, table = book_move(gs), 0, None
+    if best_move is None and THREADS > 1 and ponder_hit is None:
+        best_move, score = parallel_search(gs, root_moves, budget)
+        table = shared_table
+    elif best_move is None:
+        best_move, score = search(gs, root_moves, budget)
+        table = transposition_table
+    if ponder_hit is not None:
+        while not (ponder_hit.is_set() or stop.is_set()): # finished early, the move isn't wanted before the hit
+            stop.wait(0.05)
+    if stop is not None and stop.is_set():
+        return None
+    if table is None:
+        print("book move", move_name(gs, best_move))
+        return best_move, score, None
+    print("best move", move_name(gs, best_move), "score", score, "nodes", counter)
+    print("TT hit rate", round(table.hit_rate(), 3))
+    print("first move cutoff rate", round(first_move_cutoffs / max(cutoff_nodes, 1), 3))
+    return best_move, score, predicted_reply(gs, best_move, table)
+
+'''
+A move code of gs in SAN for printing
+'''
+def move_name(gs, move):
+    return gs.san(move) if move is not None else "none"
+
+'''
+A move from the opening book for gs, or None if there is no book or the position isn't in it
+'''
+def book_move(gs):
+    global book
+    if not USE_BOOK:
+        return None
+    if book is None:
+        if not os.path.exists(BOOK_PATH):
+            return None
+        book = OpeningBook(BOOK_PATH)
+    return book.choose(gs)
+
+'''
+The reply to move the search expects, the hash move in table of the position after it if that is legal there
+'''
+def predicted_reply(gs, move, table):
+    if move is None:
+        return None
+    gs.push(move)
+    entry = table.probe(gs.zobristKey)
+    reply = None
+    if entry is not None and entry[3] in gs.generate_moves([]):
+        reply = entry[3]
+    gs.pop()
+    return reply
+
+'''
+Iterative deepening: search depth 1, 2, 3, ... until the time budget (seconds, None for no limit) runs out or
+max_depth is done, and return the best move code of the last depth that finished with its score for the side to
+move. Each iteration tries the previous best move first at the root, and the transposition table hands the rest of
+the previous best line to the nodes below. The first depth, start_depth, always finishes. report is called with
+(depth, move, score) after each depth.
+After the first depth the root is searched with an aspiration window around the previous score, which is widened
+and searched again if the score falls outside it
+'''
+def search(gs, root_moves, budget=None, max_depth=MAX_DEPTH, verbose=True, start_depth=1, report=None):
+    global next_move, counter, deadline, transposition_table
+    start = time.perf_counter()
     counter = 0
-    next_move = None
-    random.shuffle(valid_moves)
-    #find_move_min_max(gs, valid_moves, DEPTH, gs.whiteToMove)
-    #find_move_nega_max(gs, valid_moves, DEPTH, 1 if gs.white_to_move else -1)
-    find_move_nega_max_alpha_beta(gs, valid_moves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.white_to_move else -1)
-    #find_random_move(valid_moves)
-    #find_best_move_no_recursion(gs, valid_moves)
-    print(counter)
-    return_queue.put(next_move)
+    deadline = None
+    if transposition_table is None:
+        transposition_table = TranspositionTable(TT_SIZE_MB)
+    transposition_table.new_search()
+    clear_move_ordering()
+    root_moves = list(root_moves)
+    root_length = len(gs.undoLog)
+    turn_multiplier = 1 if gs.white_to_move else -1
+    best_move = None
+    best_score = 0
+    for depth in range(min(start_depth, max_depth), max_depth + 1):
+        window = ASPIRATION_WINDOW
+        if depth > start_depth and window and abs(best_score) < CHECKMATE:
+            alpha, beta = best_score - window, best_score + window
+        else:
+            alpha, beta = -CHECKMATE, CHECKMATE
+        try:
+            while True:
+                next_move = None
+                score = find_move_nega_max_alpha_beta(gs, list(root_moves), depth, alpha, beta, turn_multiplier)
+                window *= 2
+                if score <= alpha and alpha > -CHECKMATE: # failed low
+                    alpha = max(best_score - window, -CHECKMATE)
+                elif score >= beta and beta < CHECKMATE: # failed high
+                    beta = min(best_score + window, CHECKMATE)
+                else:
+                    break
+        except SearchTimeout:
+            while len(gs.undoLog) > root_length: # take back the moves the search had made
+                gs.pop()
+            break
+        best_move = next_move
+        best_score = score
+        if best_move is not None: # start the next iteration with this move
+            root_moves.remove(best_move)
+            root_moves.insert(0, best_move)
+        elapsed = time.perf_counter() - start
+        if verbose:
+            print("depth", depth, "move", move_name(gs, best_move), "score", score, "nodes", counter, "time",
+                  round(elapsed, 2))
+        if report is not None:
+            report(depth, best_move, best_score)
+        if budget is not None:
+            deadline = start + budget
+        elif ponder_hit_event is not None and ponder_hit_event.is_set():
+            deadline = ponder_deadline # pondering has turned into the real search, it has a budget now
+        # an iteration takes several times longer than the last, don't start one that can't finish
+        if deadline is not None and elapsed > (deadline - start) / 2:
+            break
+        if abs(score) >= CHECKMATE or len(root_moves) <= 1:
+            break
+    return best_move, best_score
+
+'''
+Lazy SMP: threads processes run search on the same root at once and share a transposition table in shared memory,
+so each mostly finds the positions the others have already searched. Half of them start one depth deeper and each
+breaks ties in the root move order differently, so they don't all search the same tree in step. The move comes from
+the deepest depth any of them finished. Once one finishes max_depth, or stop_event is set, the rest are stopped
+'''
+def parallel_search(gs, root_moves, budget=None, max_depth=MAX_DEPTH, threads=None):
+    global counter, shared_table
+    threads = threads or THREADS
+    if shared_table is None:
+        shared_table = TranspositionTable(TT_SIZE_MB, shared=True)
+    shared_table.new_search()
+    stop = Event()
+    results = Queue()
+    workers = [Process(target=search_worker, daemon=True,
+                       args=(i, gs, list(root_moves), shared_table.handle(), budget, max_depth, 1 + i % 2, stop,
+                             results))
+               for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    best_depth, best_move, best_score = 0, None, 0
+    nodes = [0] * threads
+    running = threads
+    while running:
+        if stop_event is not None and stop_event.is_set():
+            stop.set()
+        try:
+            worker, depth, move, score, worker_nodes = results.get(timeout=0.05)
+        except queue.Empty:
+            continue
+        nodes[worker] = worker_nodes
+        if depth is None: # the worker is done
+            running -= 1
+        elif depth > best_depth:
+            best_depth, best_move, best_score = depth, move, score
+            if depth >= max_depth:
+                stop.set()
+    for worker in workers:
+        worker.join()
+    counter = sum(nodes)
+    return best_move, best_score
+
+'''
+One process of parallel_search. Puts (worker, depth, move, score, nodes so far) on results after each depth it
+finishes, and (worker, None, None, None, nodes) when it stops
+'''
+def search_worker(worker, gs, root_moves, table_handle, budget, max_depth, start_depth, stop, results):
+    global transposition_table, stop_event, ponder_hit_event
+    transposition_table = TranspositionTable.attach(table_handle)
+    stop_event = stop
+    ponder_hit_event = None
+    random.Random(worker).shuffle(root_moves)
+    try:
+        search(gs, root_moves, budget, max_depth, verbose=False, start_depth=start_depth,
+               report=lambda depth, move, score: results.put((worker, depth, move, score, counter)))
+    finally:
+        results.put((worker, None, None, None, counter))
+        transposition_table.close()
+
+'''
+Stop the search by raising SearchTimeout once the deadline has passed or stop_event is set. When a ponder hit
+comes in the pondering deadline starts to apply
+'''
+def check_time():
+    global deadline
+    if ponder_hit_event is not None and deadline is None and ponder_hit_event.is_set():
+        deadline = ponder_deadline
+    if deadline is not None and time.perf_counter() > deadline or stop_event is not None and stop_event.is_set():
+        raise SearchTimeout()
+
+'''
+Forget killers and statistics from the last search and age the history scores so recent cutoffs count for more
+'''
+def clear_move_ordering():
+    global cutoff_nodes, first_move_cutoffs
+    for ply_killers in killers:
+        ply_killers[0] = ply_killers[1] = NO_MOVE
+    for side_history in history.values():
+        for i in range(4096):
+            side_history[i] >>= 1
+    cutoff_nodes = 0
+    first_move_cutoffs = 0
+
+'''
+Free the shared table, once this process won't search any more
+'''
+def shutdown():
+    global shared_table
+    if shared_table is not None:
+        shared_table.close()
+        shared_table = None
+
+'''
+Settings given as "NAME=VALUE" (the --set option of the benchmark tools) as (name, value) pairs. Raises ValueError
+for a name that isn't a ChessAI setting or a value that isn't a Python literal
+'''
+def parse_settings(settings):
+    parsed = []
+    for setting in settings:
+        name, _, value = setting.partition("=")
+        if not name.isupper() or name not in globals():
+            raise ValueError("ChessAI has no setting " + name)
+        try:
+            parsed.append((name, ast.literal_eval(value)))
+        except (ValueError, SyntaxError):
+            raise ValueError("bad value for {}: {}".format(name, value)) from None
+    return parsed
+
+'''
+Change settings, given as (name, value) pairs from parse_settings
+'''
+def apply_settings(settings):
+    globals().update(settings)
+
+'''
+Forget everything earlier searches learned, for a new game
+'''
+def new_game():
+    if transposition_table is not None:
+        transposition_table.clear()
+    if shared_table is not None:
+        shared_table.clear()
+    for side_history in history.values():
+        side_history[:] = [0] * 4096
+
+'''
+Sort moves (packed move codes) so the ones most likely to cause a cutoff are searched first
+'''
+def order_moves(gs, moves, hash_move, ply):
+    squares = gs.squares
+    killer_1, killer_2 = killers[ply]
+    side_history = history[gs.white_to_move]
+
+    def order(move):
+        if move == hash_move:
+            return HASH_MOVE_ORDER
+        victim = squares[(move >> 6) & 63]
+        flag = move & FLAG_MASK
+        if victim != EMPTY:
+            score = CAPTURE_ORDER + MVV_LVA[victim[0]][squares[move & 63][0]]
+            if flag == PROMOTION:
+                score += 100 * piece_score[PROMOTION_PIECES[move >> 14]]
+            return score
+        if flag == PROMOTION:
+            return CAPTURE_ORDER + 100 * piece_score[PROMOTION_PIECES[move >> 14]]
+        if flag == EN_PASSANT:
+            return CAPTURE_ORDER + MVV_LVA['P']['P']
+        if move == killer_1:
+            return KILLER_ORDER + 1
+        if move == killer_2:
+            return KILLER_ORDER
+        return side_history[move & 4095]
+
+    moves.sort(key=order, reverse=True)
+
+'''
+Remember a move that caused a beta cutoff. Only quiet moves become killers or get history, captures are already
+ordered well by MVV-LVA
+'''
+def record_cutoff(gs, move, depth, ply):
+    if gs.squares[(move >> 6) & 63] != EMPTY or move & FLAG_MASK in (EN_PASSANT, PROMOTION):
+        return
+    ply_killers = killers[ply]
+    if move != ply_killers[0]:
+        ply_killers[1] = ply_killers[0]
+        ply_killers[0] = move
+    history[gs.white_to_move][move & 4095] += depth * depth
 
 def find_best_move_min_max(gs, valid_moves):
     global next_move
@@ -175,34 +564,220 @@ def find_move_nega_max(gs, valid_moves, depth, turn_multiplier):
 
     return max_score
 
-def find_move_nega_max_alpha_beta(gs, valid_moves, depth, alpha, beta, turn_multiplier):
-    global next_move, counter
-    counter += 1
+'''
+Works on packed move codes (see ChessEngine.Move). valid_moves is only passed in at the root (ply 0). Other nodes
+look the position up in the transposition table first and only generate their moves if the stored result can't be
+used. At depth 0 the quiescence search takes over. Raises SearchTimeout when check_time says to stop
+'''
+def find_move_nega_max_alpha_beta(gs, valid_moves, depth, alpha, beta, turn_multiplier, ply=0):
+    global next_move, counter, cutoff_nodes, first_move_cutoffs
     if depth == 0:
-        return turn_multiplier * score_board(gs)
+        return quiescence(gs, alpha, beta, turn_multiplier, ply)
+    counter += 1
+    if counter % TIME_CHECK_NODES == 0:
+        check_time()
+    key = gs.zobristKey
+    alpha_original = alpha
+    hash_move = NO_MOVE
+    entry = transposition_table.probe(key)
+    if entry is not None:
+        entry_depth, entry_score, entry_flag, hash_move = entry
+        if entry_depth >= depth and ply != 0: # the root always searches so next_move gets set
+            if entry_flag == EXACT:
+                return entry_score
+            elif entry_flag == LOWER_BOUND:
+                alpha = max(alpha, entry_score)
+            else:
+                beta = min(beta, entry_score)
+            if alpha >= beta:
+                return entry_score
+
+    if valid_moves is None:
+        valid_moves = gs.generate_moves(move_buffers[ply])
+        if not valid_moves:
+            return -CHECKMATE if gs.inCheck else STALEMATE
+    in_check = gs.inCheck
+
+    # a bitbase draw is exact, nothing below can change it. Won positions are still searched for the mate, with
+    # score_board scoring the leaves from the bitbase
+    if (USE_BITBASES and ply != 0 and (gs.occupied['w'] | gs.occupied['b']).bit_count() <= Bitbase.MAX_PIECES
+            and Bitbase.probe(gs) == Bitbase.DRAW):
+        return STALEMATE
+
+    # if passing still leaves us at or above beta, a real move will too. Only tried in zero window nodes, and not
+    # when in check (passing is illegal), after a null move, or with only pawns left, where having to move can be
+    # what loses (zugzwang)
+    if (USE_NULL_MOVE and ply != 0 and depth >= NULL_MOVE_MIN_DEPTH and not in_check and beta - alpha <= SCORE_STEP
+            and beta < CHECKMATE and gs.undoLog[-1][0] != NULL_MOVE and has_pieces(gs)
+            and turn_multiplier * score_board(gs) >= beta):
+        gs.push_null()
+        score = -find_move_nega_max_alpha_beta(gs, None, max(depth - 1 - NULL_MOVE_REDUCTION, 0), -beta,
+                                               -beta + SCORE_STEP, -turn_multiplier, ply + 1)
+        gs.pop()
+        if score >= beta:
+            score = min(score, CHECKMATE - SCORE_STEP) # a mate found by passing isn't a real mate
+            transposition_table.store(key, depth, score, LOWER_BOUND, hash_move)
+            return score
+
+    order_moves(gs, valid_moves, hash_move, ply)
+    squares = gs.squares
+    ply_killers = killers[ply]
 
     max_score = -CHECKMATE
-    for move in valid_moves:
-        gs.make_move(move)
-        next_moves = gs.get_valid_moves()
-        score = -find_move_nega_max_alpha_beta(gs, next_moves, depth - 1, -beta, -alpha, -turn_multiplier)
+    best_move = None
+    for i, move in enumerate(valid_moves):
+        reduction = 0
+        if (USE_LMR and i >= LMR_MIN_MOVES and depth >= LMR_MIN_DEPTH and not in_check
+                and squares[(move >> 6) & 63] == EMPTY and move & FLAG_MASK not in (EN_PASSANT, PROMOTION)
+                and move not in ply_killers):
+            reduction = min(lmr_reductions[depth][min(i, 63)], depth - 1)
+        gs.push(move)
+        if reduction and gs.in_check(): # moves that give check are searched at full depth
+            reduction = 0
+        if i == 0:
+            score = -find_move_nega_max_alpha_beta(gs, None, depth - 1, -beta, -alpha, -turn_multiplier, ply + 1)
+        else:
+            # with PVS, only show this move is no better than alpha and search it properly if it turns out better
+            scout_beta = alpha + SCORE_STEP if USE_PVS else beta
+            score = -find_move_nega_max_alpha_beta(gs, None, depth - 1 - reduction, -scout_beta, -alpha,
+                                                   -turn_multiplier, ply + 1)
+            if reduction and score > alpha: # the reduced search may have missed something
+                score = -find_move_nega_max_alpha_beta(gs, None, depth - 1, -scout_beta, -alpha,
+                                                       -turn_multiplier, ply + 1)
+            if USE_PVS and alpha < score < beta:
+                score = -find_move_nega_max_alpha_beta(gs, None, depth - 1, -beta, -alpha, -turn_multiplier,
+                                                       ply + 1)
         if score > max_score:
             max_score = score
-            if depth == DEPTH:
+            best_move = move
+            if ply == 0:
                 next_move = move
-                print(move, score)
-        gs.undo_move()
+        elif ply == 0 and next_move is None: # every move so far gets mated, still have one to play
+            next_move = move
+        gs.pop()
         if max_score > alpha: # pruning happens
             alpha = max_score
         if alpha >= beta:
+            cutoff_nodes += 1
+            if i == 0:
+                first_move_cutoffs += 1
+            record_cutoff(gs, move, depth, ply)
             break
 
+    if max_score <= alpha_original:
+        flag = UPPER_BOUND
+    elif max_score >= beta:
+        flag = LOWER_BOUND
+    else:
+        flag = EXACT
+    transposition_table.store(key, depth, max_score, flag, best_move if best_move is not None else NO_MOVE)
     return max_score
 
+'''
+True if the side to move has a piece other than pawns and the king
+'''
+def has_pieces(gs):
+    colour = '-w' if gs.white_to_move else '-b'
+    bitboards = gs.bitboards
+    return bool(bitboards['N' + colour] | bitboards['B' + colour] | bitboards['R' + colour] | bitboards['Q' + colour])
+
+'''
+Search captures and promotions until the position is quiet, so a leaf is never scored halfway through an exchange.
+The side to move can stand pat (take the static score) instead of capturing, unless it is in check, where every
+evasion is searched. The score straight after a capture is about the most it can be worth, since the opponent can
+stand pat too, so captures where that is at least DELTA_MARGIN below alpha are skipped (delta pruning)
+'''
+def quiescence(gs, alpha, beta, turn_multiplier, ply):
+    global counter
+    counter += 1
+    if counter % TIME_CHECK_NODES == 0:
+        check_time()
+    if ply >= MAX_PLY: # out of move buffers, a long run of checks and evasions can get here
+        return turn_multiplier * score_board(gs)
+    in_check = gs.in_check()
+    if in_check:
+        moves = gs.generate_moves(move_buffers[ply])
+        if not moves:
+            return -CHECKMATE
+        best_score = -CHECKMATE
+    else:
+        best_score = stand_pat = turn_multiplier * score_board(gs)
+        if best_score >= beta:
+            return best_score
+        if best_score > alpha:
+            alpha = best_score
+        moves = gs.generate_moves(move_buffers[ply], captures_only=True)
+
+    order_moves(gs, moves, NO_MOVE, ply)
+    squares = gs.squares
+    for move in moves:
+        if not in_check:
+            start, end = move & 63, (move >> 6) & 63
+            flag = move & FLAG_MASK
+            mover = squares[start]
+            arrival = PROMOTION_PIECES[move >> 14] + mover[1:] if flag == PROMOTION else mover
+            victim_sq = (start & ~7) | (end & 7) if flag == EN_PASSANT else end
+            change = score_table[arrival][end] - score_table[mover][start]
+            if squares[victim_sq] != EMPTY:
+                change -= score_table[squares[victim_sq]][victim_sq]
+            bound = stand_pat + turn_multiplier * change + DELTA_MARGIN
+            if bound <= alpha: # delta pruning
+                if bound > best_score: # the skipped move could still be worth up to bound
+                    best_score = bound
+                continue
+        gs.push(move)
+        score = -quiescence(gs, -beta, -alpha, -turn_multiplier, ply + 1)
+        gs.pop()
+        if score > best_score:
+            best_score = score
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+    return best_score
+
 '''
 A positive score is good for white, a negative score is good for black
 '''
 def score_board(gs):
+    if gs.checkmate:
+        if gs.white_to_move:
+            return -CHECKMATE # black wins
+        else:
+            return CHECKMATE # white wins
+    if USE_BITBASES and (gs.occupied['w'] | gs.occupied['b']).bit_count() <= Bitbase.MAX_PIECES:
+        result = Bitbase.probe(gs)
+        if result is not None:
+            return result * (BITBASE_WIN + endgame_progress(gs, 'w' if result > 0 else 'b')) if result else 0
+    if gs.scoreTable is not score_table:
+        gs.set_score_table(score_table)
+    return gs.boardScore
+
+
+# squares a king on each square is away from the middle four, counting along ranks and files
+CENTRE_DISTANCE = [max(3 - r, r - 4) + max(3 - c, c - 4) for r in range(8) for c in range(8)]
+
+'''
+Bonus for the winning side of a bitbase ending, so the search makes progress instead of shuffling between won
+positions: a queen over a rook over a pawn, then an advanced pawn, or the losing king near the edge and the kings
+close together
+'''
+def endgame_progress(gs, colour):
+    bitboards = gs.bitboards
+    pawns = bitboards['P-' + colour]
+    if pawns:
+        row = (pawns.bit_length() - 1) >> 3
+        return 6 * piece_score['P'] + (6 - row if colour == 'w' else row - 1)
+    piece = 'Q' if bitboards['Q-' + colour] else 'R'
+    king = bitboards['K-' + colour].bit_length() - 1
+    other_king = bitboards['K-' + ('b' if colour == 'w' else 'w')].bit_length() - 1
+    kings_apart = abs((king >> 3) - (other_king >> 3)) + abs((king & 7) - (other_king & 7))
+    return 6 * piece_score[piece] + 2 * CENTRE_DISTANCE[other_king] + 14 - kings_apart
+
+'''
+score_board worked out square by square. The running total in GameState.boardScore has to always equal this
+'''
+def score_board_full(gs):
     if gs.checkmate:
         if gs.white_to_move:
             return -CHECKMATE # black wins
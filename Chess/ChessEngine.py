@@ -2,16 +2,162 @@
 Responsible for storing all the information about current state of chess game. Also determines valid moves and
 has a move log.
 """
-from tkinter import *
-import numpy as np
+import random
+
+'''
+Squares are numbered 0 to 63 row by row from the top left corner (a8), so square = row * 8 + col.
+A bitboard is an int where bit n is set when square n is in the set.
+'''
+EMPTY = "---"
+WHITE_PIECES = ("P-w", "N-w", "B-w", "R-w", "Q-w", "K-w")
+BLACK_PIECES = ("P-b", "N-b", "B-b", "R-b", "Q-b", "K-b")
+ALL_SQUARES = (1 << 64) - 1
+FILE_A = sum(1 << (r * 8) for r in range(8))
+FILE_H = FILE_A << 7
+RANK_8 = (1 << 8) - 1
+RANK_1 = RANK_8 << 56
+CASTLING_SQUARES = (0, 4, 7, 56, 60, 63) # king and rook home squares
+
+'''
+The engine packs a move into an int: bits 0-5 are the start square, bits 6-11 the end square, bits 12-13 say if
+it is an en passant capture, a castle or a pawn promotion and bits 14-15 pick the promotion piece from
+PROMOTION_PIECES. Whether the move is a capture comes from the board
+'''
+EN_PASSANT = 1 << 12
+CASTLE = 2 << 12
+PROMOTION = 3 << 12
+FLAG_MASK = 3 << 12
+PROMOTION_PIECES = ('Q', 'R', 'B', 'N')
+NULL_MOVE = 0 # a8 to a8, never a real move. push_null logs it
+SQUARE_NAMES = [file + rank for rank in "87654321" for file in "abcdefgh"] # by square number, a8 is 0
+
+
+def _step_table(offsets):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        bb = 0
+        for dr, dc in offsets:
+            if 0 <= r + dr < 8 and 0 <= c + dc < 8:
+                bb |= 1 << ((r + dr) * 8 + c + dc)
+        table.append(bb)
+    return table
+
+
+def _ray_table(dr, dc):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        bb = 0
+        r, c = r + dr, c + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            bb |= 1 << (r * 8 + c)
+            r, c = r + dr, c + dc
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _step_table(((-2, -1), (-2, 1), (2, -1), (2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2)))
+KING_ATTACKS = _step_table(((-1, -1), (-1, 0), (-1, 1), (1, -1), (1, 1), (1, 0), (0, -1), (0, 1)))
+PAWN_ATTACKS = {'w': _step_table(((-1, -1), (-1, 1))), 'b': _step_table(((1, -1), (1, 1)))}
+
+# (ray table, True if the ray runs towards higher square numbers)
+ROOK_RAYS = tuple((_ray_table(dr, dc), dr * 8 + dc > 0) for dr, dc in ((-1, 0), (0, -1), (1, 0), (0, 1)))
+BISHOP_RAYS = tuple((_ray_table(dr, dc), dr * 8 + dc > 0) for dr, dc in ((-1, -1), (-1, 1), (1, -1), (1, 1)))
+# every square a rook or bishop on an empty board could reach from each square
+ROOK_LINES = [sum(ray_table[sq] for ray_table, _ in ROOK_RAYS) for sq in range(64)]
+BISHOP_LINES = [sum(ray_table[sq] for ray_table, _ in BISHOP_RAYS) for sq in range(64)]
+
+'''
+Squares a rook or bishop on sq attacks along the given rays, stopping at (and including) the first piece on each ray
+'''
+def slider_attacks(sq, occupied, rays):
+    attacks = 0
+    for ray_table, positive in rays:
+        ray = ray_table[sq]
+        blockers = ray & occupied
+        if blockers:
+            if positive:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= ray_table[first]
+        attacks |= ray
+    return attacks
+
+'''
+Zobrist keys: one random 64-bit number per (piece, square), for black to move, for each of the 16 combinations of
+castling rights and for each en passant file. A position's key is the XOR of the numbers for everything in it,
+so a move only has to XOR the parts it changes. The generator is seeded so keys are the same in every process.
+'''
+_zobrist_random = random.Random(20240229)
+ZOBRIST_PIECES = {piece: [_zobrist_random.getrandbits(64) for _ in range(64)] for piece in WHITE_PIECES + BLACK_PIECES}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EN_PASSANT = [_zobrist_random.getrandbits(64) for _ in range(8)]
+
+# score table used until the AI sets its own with set_score_table
+ZERO_SCORES = {piece: [0] * 64 for piece in WHITE_PIECES + BLACK_PIECES}
+
+
+class BoardView():
+    '''
+    Read-only 8x8 view over the square list so the GUI and AI can keep using board[r][c] and board[r, c]
+    '''
+    def __init__(self, squares):
+        self.squares = squares
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            return self.squares[key[0] * 8 + key[1]]
+        return self.squares[key * 8:key * 8 + 8]
+
+    def __len__(self):
+        return 8
+
+    def __iter__(self):
+        for r in range(8):
+            yield self.squares[r * 8:r * 8 + 8]
+
+
+'''
+Read a FEN string. Returns (8x8 layout, white to move, CastleRights, en passant square as (row, col) or (),
+halfmove clock, fullmove number). Missing fields after the board get their usual defaults
+'''
+def parse_fen(fen):
+    fields = fen.split()
+    layout = []
+    for rank in fields[0].split('/'):
+        row = []
+        for char in rank:
+            if char.isdigit():
+                row.extend([EMPTY] * int(char))
+            else:
+                row.append(char.upper() + ('-w' if char.isupper() else '-b'))
+        layout.append(row)
+    if len(layout) != 8 or any(len(row) != 8 for row in layout):
+        raise ValueError("bad FEN board: " + fields[0])
+    white_to_move = len(fields) < 2 or fields[1] == 'w'
+    castling = fields[2] if len(fields) > 2 else '-'
+    castle_rights = CastleRights('K' in castling, 'k' in castling, 'Q' in castling, 'q' in castling)
+    enpassant = ()
+    if len(fields) > 3 and fields[3] != '-':
+        enpassant = (Move.ranksToRows[fields[3][1]], Move.tilesToCols[fields[3][0]])
+    halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+    fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+    return layout, white_to_move, castle_rights, enpassant, halfmove_clock, fullmove_number
+
 
 class GameState():
-    def __init__(self):
-        # Board is 8x8 2D list
+    '''
+    Starts from the usual starting position, or from the position in fen if one is given
+    '''
+    def __init__(self, fen=None):
+        # The starting layout as rows of piece strings, rank 8 first
         # The first character represents the piece (i.e King or Pawn, etc) and the third character
         # represents the colour (i.e., "b" or "w" for black or white).
         # The second character is a dash, thus these are 3 character strings
-        self.board = np.array([
+        layout = [
             ["R-b", "N-b", "B-b", "Q-b", "K-b", "B-b", "N-b", "R-b"],
             ["P-b", "P-b", "P-b", "P-b", "P-b", "P-b", "P-b", "P-b"],
             ["---", "---", "---", "---", "---", "---", "---", "---"],
@@ -19,163 +165,288 @@ class GameState():
             ["---", "---", "---", "---", "---", "---", "---", "---"],
             ["---", "---", "---", "---", "---", "---", "---", "---"],
             ["P-w", "P-w", "P-w", "P-w", "P-w", "P-w", "P-w", "P-w"],
-            ["R-w", "N-w", "B-w", "Q-w", "K-w", "B-w", "N-w", "R-w"]])
+            ["R-w", "N-w", "B-w", "Q-w", "K-w", "B-w", "N-w", "R-w"]]
+        white_to_move = True
+        castle_rights = CastleRights(True, True, True, True)
+        enpassant = ()
+        halfmove_clock = 0
+        fullmove_number = 1
+        if fen is not None:
+            layout, white_to_move, castle_rights, enpassant, halfmove_clock, fullmove_number = parse_fen(fen)
+        # the position is stored twice: a flat list of 64 piece strings for "what is on this square" and
+        # one bitboard per piece plus one occupancy bitboard per colour for move generation
+        self.squares = [EMPTY] * 64
+        self.zobristKey = 0
+        self.scoreTable = ZERO_SCORES
+        self.boardScore = 0
+        self.bitboards = {piece: 0 for piece in WHITE_PIECES + BLACK_PIECES}
+        self.occupied = {'w': 0, 'b': 0}
+        for r in range(8):
+            for c in range(8):
+                if layout[r][c] != EMPTY:
+                    self.add_piece(r * 8 + c, layout[r][c])
+        self.board = BoardView(self.squares)
         self.moveFunctions = {'P': self.get_pawn_moves, 'R': self.get_rook_moves, 'N': self.get_knight_moves,
         'B': self.get_bishop_moves, 'K': self.get_king_moves, 'Q': self.get_queen_moves}
-        self.white_to_move = True
+        self.white_to_move = white_to_move
         self.moveLog = []
-        self.whiteKingLocation = (7, 4)
-        self.blackKingLocation = (0, 4)
+        self.undoLog = [] # (move code, piece moved, piece captured) for every push, popped by pop
+        self.whiteKingLocation = divmod(self.bitboards['K-w'].bit_length() - 1, 8)
+        self.blackKingLocation = divmod(self.bitboards['K-b'].bit_length() - 1, 8)
 
-        self.pins = []
+        self.inCheck = False
+        self.pins = {}
         self.checks = []
         self.checkmate = False
         self.stalemate = False
-        self.enpassantPossible = () # coordinates for the square where en passant capture is possible
+        self.enpassantPossible = enpassant # coordinates for the square where en passant capture is possible
         self.enPassantPossibleLog = [self.enpassantPossible]
-        self.currentCastlingRight = CastleRights(True, True, True, True)
-        self.castleRightsLog = [CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
-                                           self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)]
+        self.currentCastlingRight = castle_rights
+        self.castleRightsLog = [self.currentCastlingRight]
+        self.halfmoveClock = halfmove_clock # plies since the last capture or pawn move, for the fifty move rule
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.fullmoveNumber = fullmove_number # starts at 1 and goes up after every black move
+        self.zobristKey = self.compute_zobrist_key()
 
+    '''
+    The position as a FEN string. The en passant square is given after every two square pawn move, as in the FEN
+    standard, whether or not a capture is possible
+    '''
+    def to_fen(self):
+        rows = []
+        for r in range(8):
+            row = ""
+            empty = 0
+            for piece in self.squares[r * 8:r * 8 + 8]:
+                if piece == EMPTY:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += piece[0] if piece[2] == 'w' else piece[0].lower()
+            rows.append(row + str(empty) if empty else row)
+        rights = self.currentCastlingRight
+        castling = "".join(letter for letter, right in (('K', rights.wks), ('Q', rights.wqs), ('k', rights.bks),
+                                                         ('q', rights.bqs)) if right) or "-"
+        enpassant = "-"
+        if self.enpassantPossible:
+            enpassant = Move.colsToTiles[self.enpassantPossible[1]] + Move.rowsToRanks[self.enpassantPossible[0]]
+        return "{} {} {} {} {} {}".format("/".join(rows), 'w' if self.white_to_move else 'b', castling, enpassant,
+                                          self.halfmoveClock, self.fullmoveNumber)
 
+    '''
+    Zobrist key of the current position computed from scratch. make_move and undo_move keep self.zobristKey equal
+    to this without rescanning the board
+    '''
+    def compute_zobrist_key(self):
+        key = 0
+        for sq in range(64):
+            if self.squares[sq] != EMPTY:
+                key ^= ZOBRIST_PIECES[self.squares[sq]][sq]
+        if not self.white_to_move:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        return key ^ self.state_key()
+
+    '''
+    Keep boardScore equal to the sum of table[piece][square] over every piece on the board. The table comes from the
+    AI, add_piece and remove_piece then update the total so reading it costs nothing
+    '''
+    def set_score_table(self, table):
+        self.scoreTable = table
+        self.boardScore = 0
+        for sq in range(64):
+            if self.squares[sq] != EMPTY:
+                self.boardScore += table[self.squares[sq]][sq]
+
+    '''
+    The part of the Zobrist key for castling rights and en passant, XORed out and back in whenever they change
+    '''
+    def state_key(self):
+        key = ZOBRIST_CASTLING[self.currentCastlingRight.index()]
+        if self.enpassantPossible:
+            key ^= ZOBRIST_EN_PASSANT[self.enpassantPossible[1]]
+        return key
+
+    '''
+    Put a piece on an empty square / take the piece off a square, keeping the bitboards in step with the squares
+    '''
+    def add_piece(self, sq, piece):
+        bit = 1 << sq
+        self.squares[sq] = piece
+        self.bitboards[piece] |= bit
+        self.occupied[piece[2]] |= bit
+        self.zobristKey ^= ZOBRIST_PIECES[piece][sq]
+        self.boardScore += self.scoreTable[piece][sq]
+
+    def remove_piece(self, sq):
+        piece = self.squares[sq]
+        bit = 1 << sq
+        self.squares[sq] = EMPTY
+        self.bitboards[piece] ^= bit
+        self.occupied[piece[2]] ^= bit
+        self.zobristKey ^= ZOBRIST_PIECES[piece][sq]
+        self.boardScore -= self.scoreTable[piece][sq]
+        return piece
+
+    '''
+    Make a Move and add it to the move log. A pawn promotion is made to move.promotedPiece. The move's SAN is worked
+    out first, while the position before it is still on the board
+    '''
     def make_move(self, move):
-        self.board[move.startRow, move.startCol] = "---"
-        self.board[move.endRow, move.endCol] = move.pieceMoved
+        if move.san is None:
+            move.san = self.san(move.code)
+            move.is_check = move.san[-1] in "+#"
+            move.is_checkmate = move.san[-1] == "#"
+        self.push(move.code)
         self.moveLog.append(move)
+
+
+    '''
+    Undo previous move made
+    '''
+    def undo_move(self):
+        if len(self.moveLog) != 0: # make sure there is a move to undo
+            self.moveLog.pop()
+            self.pop()
+
+    '''
+    Make a packed move (see Move). This is what the search uses, nothing is added to moveLog
+    '''
+    def push(self, code):
+        start = code & 63
+        end = code >> 6 & 63
+        flag = code & FLAG_MASK
+        squares = self.squares
+        self.zobristKey ^= self.state_key() ^ ZOBRIST_BLACK_TO_MOVE
+        piece_moved = self.remove_piece(start)
+        piece_captured = squares[end]
+        if piece_captured != EMPTY:
+            self.remove_piece(end)
+        if flag == PROMOTION:
+            self.add_piece(end, PROMOTION_PIECES[code >> 14] + piece_moved[1:])
+        else:
+            self.add_piece(end, piece_moved)
+            if flag == EN_PASSANT:
+                piece_captured = self.remove_piece(start & ~7 | end & 7) # the pawn beside the moving pawn
+            elif flag == CASTLE:
+                if end > start: # king side castle
+                    self.add_piece(end - 1, self.remove_piece(end + 1))
+                else: # queenside
+                    self.add_piece(end + 1, self.remove_piece(end - 2))
+        self.undoLog.append((code, piece_moved, piece_captured))
         self.white_to_move = not self.white_to_move  # switch player turn
+
         # update king position
-        if move.pieceMoved == "K-w":
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == "K-b":
-            self.blackKingLocation = (move.endRow, move.endCol)
-
-        # pawn promotion
-        if move.isPawnPromotion:
-            promo_window = Tk()
-            promo_window.title("Choose Pawn Promotion")
-            promo_window.geometry("200x150")
-
-            def promote_piece(piece):
-                move.promotedPiece = piece + '-' + move.pieceMoved[2]
-                promo_window.destroy()
-                self.board[move.endRow][move.endCol] = move.promotedPiece
-
-            Label(promo_window, text="Pawn Promotion").pack()
-            Button(promo_window, text="Queen", command=lambda: promote_piece("Q")).pack(fill=X)
-            Button(promo_window, text="Rook", command=lambda: promote_piece("R")).pack(fill=X)
-            Button(promo_window, text="Bishop", command=lambda: promote_piece("B")).pack(fill=X)
-            Button(promo_window, text="Knight", command=lambda: promote_piece("N")).pack(fill=X)
-
-            promo_window.mainloop()
-
-        # enpassant
-        if move.isEnpassantMove:
-            self.board[move.startRow, move.endCol] = "---" # capturing pawn
+        if piece_moved == "K-w":
+            self.whiteKingLocation = (end >> 3, end & 7)
+        elif piece_moved == "K-b":
+            self.blackKingLocation = (end >> 3, end & 7)
 
         # update enpassantPossible variable
-        if move.pieceMoved[0] == 'P' and abs(move.startRow - move.endRow) == 2: # only on 2 square pawn advances
-            self.enpassantPossible = ((move.startRow + move.endRow) // 2, move.endCol)
+        if piece_moved[0] == 'P' and abs(start - end) == 16: # only on 2 square pawn advances
+            self.enpassantPossible = ((start + end) >> 4, end & 7)
         else:
             self.enpassantPossible = () # reset
-
         self.enPassantPossibleLog.append(self.enpassantPossible)
 
-        # castle move
-        if move.isCastleMove:
-            if move.endCol - move.startCol == 2: # king side castle
-                self.board[move.endRow, move.endCol - 1] = self.board[move.endRow, move.endCol + 1]
-                self.board[move.endRow, move.endCol + 1] = "---" # remove old rook
+        # castling rights - update whenever a king or rook square is moved from or to
+        if start in CASTLING_SQUARES or end in CASTLING_SQUARES:
+            self.updateCastleRights(start, end)
+        self.castleRightsLog.append(self.currentCastlingRight)
+        self.zobristKey ^= self.state_key()
+
+        self.halfmoveClock = 0 if piece_moved[0] == 'P' or piece_captured != EMPTY else self.halfmoveClock + 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if self.white_to_move: # black just moved
+            self.fullmoveNumber += 1
+
+    '''
+    Take back the last push or push_null
+    '''
+    def pop(self):
+        code, piece_moved, piece_captured = self.undoLog.pop()
+        self.zobristKey ^= self.state_key() ^ ZOBRIST_BLACK_TO_MOVE
+        if code != NULL_MOVE:
+            self.pop_pieces(code, piece_moved, piece_captured)
+        self.white_to_move = not self.white_to_move
+        self.enPassantPossibleLog.pop()
+        self.enpassantPossible = self.enPassantPossibleLog[-1]
+        self.castleRightsLog.pop() # get rid of new castle rights from recent move
+        self.currentCastlingRight = self.castleRightsLog[-1]
+        self.zobristKey ^= self.state_key()
+        self.halfmoveClockLog.pop()
+        self.halfmoveClock = self.halfmoveClockLog[-1]
+        if not self.white_to_move: # black's move was taken back
+            self.fullmoveNumber -= 1
+
+        self.checkmate = False
+        self.stalemate = False
+
+    '''
+    Put the pieces back for pop
+    '''
+    def pop_pieces(self, code, piece_moved, piece_captured):
+        start = code & 63
+        end = code >> 6 & 63
+        flag = code & FLAG_MASK
+        self.remove_piece(end) # the moved piece, or what it promoted to
+        self.add_piece(start, piece_moved)
+        # put back the captured piece, for en passant it sits beside the moving pawn's start square
+        if flag == EN_PASSANT:
+            self.add_piece(start & ~7 | end & 7, piece_captured)
+        elif piece_captured != EMPTY:
+            self.add_piece(end, piece_captured)
+        if flag == CASTLE:
+            if end > start: # kingside
+                self.add_piece(end + 1, self.remove_piece(end - 1))
             else: # queenside
-                self.board[move.endRow, move.endCol + 1] = self.board[move.endRow, move.endCol - 2]
-                self.board[move.endRow, move.endCol - 2] = "---" # remove old rook
+                self.add_piece(end - 2, self.remove_piece(end + 1))
 
-        # castling rights - update whenever there is rook or king move
-        self.updateCastleRights(move)
-        self.castleRightsLog.append(CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
-                                           self.currentCastlingRight.wqs, self.currentCastlingRight.bqs))
+        # if needed, update the king's position
+        if piece_moved == "K-w":
+            self.whiteKingLocation = (start >> 3, start & 7)
+        elif piece_moved == "K-b":
+            self.blackKingLocation = (start >> 3, start & 7)
 
+    '''
+    Pass the turn without moving a piece, for null move pruning in the search. pop takes it back
+    '''
+    def push_null(self):
+        self.zobristKey ^= self.state_key() ^ ZOBRIST_BLACK_TO_MOVE
+        self.undoLog.append((NULL_MOVE, EMPTY, EMPTY))
+        self.white_to_move = not self.white_to_move
+        self.enpassantPossible = ()
+        self.enPassantPossibleLog.append(self.enpassantPossible)
+        self.castleRightsLog.append(self.currentCastlingRight)
+        self.zobristKey ^= self.state_key()
+        self.halfmoveClock += 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if self.white_to_move:
+            self.fullmoveNumber += 1
 
     '''
-    Undo previous move made
+    Update the castle rights when a move leaves or lands on a king or rook home square. Whatever moves off the king's
+    square while the rights are still there must be the king, and anything landing on a rook's square captures it.
+    A new CastleRights is made instead of changing the old one, so the log can share unchanged rights between moves
     '''
-    def undo_move(self):
-        if len(self.moveLog) != 0: # make sure there is a move to undo
-            move = self.moveLog.pop()
-            self.board[move.startRow, move.startCol] = move.pieceMoved
-            self.board[move.endRow, move.endCol] = move.pieceCaptured
-            #self.moveLog.append(move)
-            self.white_to_move = not self.white_to_move
-            # if needed, update the king's position
-            if move.pieceMoved == "K-w":
-                self.whiteKingLocation = (move.startRow, move.startCol)
-            elif move.pieceMoved == "K-b":
-                self.blackKingLocation = (move.startRow, move.startCol)
-
-            #undo enpassant
-            if move.isEnpassantMove:
-                self.board[move.endRow, move.endCol] = "---" # remove the pawn that was on wrong square
-                self.board[move.startRow, move.endCol] = move.pieceCaptured # puts the pawn back on correct square
-
-            self.enPassantPossibleLog.pop()
-            self.enpassantPossible = self.enPassantPossibleLog[-1]
-
-            # undo 2 square pawn advance
-            if move.pieceMoved[0] == 'P' and abs(move.startRow - move.endRow):
-                self.enpassantPossible = ()
-
-            # undo castling rights
-            self.castleRightsLog.pop() # get rid of new castle rights from recent move
-            new_rights = self.castleRightsLog[-1]
-            self.currentCastlingRight = CastleRights(new_rights.wks, new_rights.bks, new_rights.wqs, new_rights.bqs) # set the current castle rights to the one before the recent move
-
-            # undo castle move
-            if move.isCastleMove:
-                if move.endCol - move.startCol == 2: # kingside
-                    self.board[move.endRow, move.endCol + 1] = self.board[move.endRow, move.endCol - 1]
-                    self.board[move.endRow, move.endCol - 1] = "---" # remove old rook
-                else: # queenside
-                    self.board[move.endRow, move.endCol - 2] = self.board[move.endRow, move.endCol + 1]
-                    self.board[move.endRow, move.endCol + 1] = "---" # remove old rook
-
-            self.checkmate = False
-            self.stalemate = False
-
-    '''
-    update the castle rights given the move
-    '''
-    def updateCastleRights(self, move):
-        if move.pieceMoved == "K-w":
-            self.currentCastlingRight.wks = False
-            self.currentCastlingRight.wqs = False
-        elif move.pieceMoved == "K-b":
-            self.currentCastlingRight.bks = False
-            self.currentCastlingRight.bqs = False
-        elif move.pieceMoved == "R-w":
-            if move.startRow == 7:
-                if move.startCol == 0: # left rook
-                    self.currentCastlingRight.wqs = False
-                elif move.startCol == 7: # right rook
-                    self.currentCastlingRight.wks = False
-        elif move.pieceMoved == "R-b":
-            if move.startRow == 0:
-                if move.startCol == 0: # left rook
-                    self.currentCastlingRight.bqs = False
-                elif move.startCol == 7: # right rook
-                    self.currentCastlingRight.bks = False
-
-        #if rook is captured
-        if move.pieceCaptured == "R-w":
-            if move.endRow == 7:
-                if move.endCol == 0:
-                    self.currentCastlingRight.wqs = False
-                elif move.endCol == 7:
-                    self.currentCastlingRight.wks = False
-        elif move.pieceCaptured == "R-b":
-            if move.endRow == 0:
-                if move.endCol == 0:
-                    self.currentCastlingRight.bqs = False
-                elif move.endCol == 7:
-                    self.currentCastlingRight.bks = False
+    def updateCastleRights(self, start, end):
+        rights = self.currentCastlingRight
+        wks, bks, wqs, bqs = rights.wks, rights.bks, rights.wqs, rights.bqs
+        for sq in (start, end):
+            if sq == 60: # white king
+                wks = wqs = False
+            elif sq == 4: # black king
+                bks = bqs = False
+            elif sq == 56: # white left rook
+                wqs = False
+            elif sq == 63: # white right rook
+                wks = False
+            elif sq == 0: # black left rook
+                bqs = False
+            elif sq == 7: # black right rook
+                bks = False
+        self.currentCastlingRight = CastleRights(wks, bks, wqs, bqs)
 
 
     '''
@@ -183,70 +454,296 @@ class GameState():
     '''
     def get_all_possible_moves(self):
         moves = []
-        for r in range(len(self.board)):
-            for c in range(len(self.board[r])):
-                turn = self.board[r, c][2]
-                if (turn == 'w' and self.white_to_move) or (turn == 'b' and not self.white_to_move):
-                    piece = self.board[r, c][0]
-                    self.moveFunctions[piece](r, c, moves)
+        for piece in (WHITE_PIECES if self.white_to_move else BLACK_PIECES):
+            pieces = self.bitboards[piece]
+            move_function = self.moveFunctions[piece[0]]
+            while pieces:
+                lowest = pieces & -pieces
+                move_function(lowest.bit_length() - 1, moves)
+                pieces ^= lowest
         return moves
 
     '''
-    All moves considering checks
+    The packed code of the legal move written in standard algebraic notation (e.g. "Nbd7", "exd5", "e8=Q+", "O-O").
+    Raises ValueError if no legal move, or more than one, fits
+    '''
+    def parse_san(self, san):
+        san = san.rstrip("+#!?")
+        if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+            kingside = len(san) == 3
+            for code in self.generate_moves([]):
+                if code & FLAG_MASK == CASTLE and ((code >> 6 & 63) > (code & 63)) == kingside:
+                    return code
+            raise ValueError("illegal move " + san)
+
+        promotion = None
+        if "=" in san:
+            san, promotion = san.split("=")
+        elif san[-1] in "QRBN" and san[0] in "abcdefgh": # promotion written without the =
+            san, promotion = san[:-1], san[-1]
+        piece = san[0] if san[0] in "NBRQK" else 'P'
+        try:
+            end = (8 - int(san[-1])) * 8 + "abcdefgh".index(san[-2])
+        except (IndexError, ValueError):
+            raise ValueError("can't read move " + san) from None
+        # what is left between the piece letter and the end square is an optional start file and/or rank
+        hint = san[1 if piece != 'P' else 0:-2].replace("x", "")
+        found = None
+        for code in self.generate_moves([], to_squares=1 << end):
+            start = code & 63
+            if code >> 6 & 63 != end or self.squares[start][0] != piece:
+                continue
+            if promotion is not None and (code & FLAG_MASK != PROMOTION or PROMOTION_PIECES[code >> 14] != promotion):
+                continue
+            if promotion is None and code & FLAG_MASK == PROMOTION:
+                continue
+            if any(("abcdefgh".index(c) != start & 7) if c in "abcdefgh" else (8 - int(c) != start >> 3)
+                   for c in hint):
+                continue
+            if found is not None:
+                raise ValueError("ambiguous move " + san)
+            found = code
+        if found is None:
+            raise ValueError("illegal move " + san)
+        return found
+
+    '''
+    Standard algebraic notation for the legal move code, with + or # when it gives check or mate. moves are the legal
+    moves of the position if the caller already has them; the piece is only given a start file or rank when another
+    legal move of the same kind of piece goes to the same square
+    '''
+    def san(self, code, moves=None):
+        start = code & 63
+        end = code >> 6 & 63
+        flag = code & FLAG_MASK
+        piece = self.squares[start]
+        capture = self.squares[end] != EMPTY or flag == EN_PASSANT
+        if flag == CASTLE:
+            text = "O-O" if end > start else "O-O-O"
+        elif piece[0] == 'P':
+            text = (SQUARE_NAMES[start][0] + "x" if capture else "") + SQUARE_NAMES[end]
+            if flag == PROMOTION:
+                text += "=" + PROMOTION_PIECES[code >> 14]
+        else:
+            if moves is None:
+                moves = self.generate_moves([])
+            rivals = [other & 63 for other in moves
+                      if other >> 6 & 63 == end and other != code and self.squares[other & 63] == piece]
+            hint = ""
+            if rivals:
+                if all(rival & 7 != start & 7 for rival in rivals):
+                    hint = SQUARE_NAMES[start][0]
+                elif all(rival >> 3 != start >> 3 for rival in rivals):
+                    hint = SQUARE_NAMES[start][1]
+                else:
+                    hint = SQUARE_NAMES[start]
+            text = piece[0] + hint + ("x" if capture else "") + SQUARE_NAMES[end]
+
+        # generate_moves overwrites the check and mate state, so it is put back afterwards
+        saved = self.inCheck, self.pins, self.checks, self.checkmate, self.stalemate
+        self.push(code)
+        king = self.bitboards['K-w' if self.white_to_move else 'K-b'].bit_length() - 1
+        if self.is_attacked(king, piece[2]):
+            text += "+" if self.generate_moves([]) else "#"
+        self.pop()
+        self.inCheck, self.pins, self.checks, self.checkmate, self.stalemate = saved
+        return text
+
+    '''
+    All moves considering checks, as Move objects for the GUI and move notation
     '''
     def get_valid_moves(self):
-        # for log in self.castleRightsLog:
-        #     print(log.wks, log.wqs, log.bks, log.bqs, end=", ")
-        #     print()
-
-        tempEnpassantPosssible = self.enpassantPossible
-        tempCastleRights = CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
-                                        self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)
-
-        #self.inCheck, self.pins, self.checks = self.check_for_pins_and_checks()
-        #1) generate all possible moves
-        moves = self.get_all_possible_moves()
-
-        #2) for each move, make the move
-        for i in range(len(moves) - 1, -1, -1):
-            self.make_move(moves[i])
-            #3) generate all opponent's moves
-            #opp_moves = self.get_all_possible_moves()
-            #4 for each of your opponent's moves, see if they attack your king
-            self.white_to_move = not self.white_to_move
-            if self.in_check():
-                moves.remove(moves[i])
-                #5) if they do attack your king, not a valid move
-            self.white_to_move = not self.white_to_move
-            self.undo_move()
+        return [Move.from_code(code, self.board) for code in self.generate_moves([])]
+
+    '''
+    All moves considering checks, packed as ints (see Move) into the given list, which is cleared first.
+    The search keeps one list per ply and reuses it. With captures_only only captures (en passant included) and
+    promotions are generated, and with to_squares only moves ending on those squares (en passant may slip through).
+    Either way castling is left out, and checkmate and stalemate are not set since an empty list doesn't mean either
+    '''
+    def generate_moves(self, moves, captures_only=False, to_squares=ALL_SQUARES):
+        moves.clear()
+        self.inCheck, self.pins, self.checks = self.check_for_pins_and_checks()
+        if self.white_to_move:
+            pieces = WHITE_PIECES
+            king_row, king_col = self.whiteKingLocation
+            oppColour = 'b'
+        else:
+            pieces = BLACK_PIECES
+            king_row, king_col = self.blackKingLocation
+            oppColour = 'w'
+        if captures_only:
+            target_mask = self.occupied[oppColour]
+            pawn_target_mask = target_mask | (RANK_8 if self.white_to_move else RANK_1) # pushes that promote
+        else:
+            target_mask = pawn_target_mask = ALL_SQUARES
+        if to_squares != ALL_SQUARES:
+            target_mask &= to_squares
+            pawn_target_mask &= to_squares
+
+        # non-king moves must stop the check, and a double check can only be answered by the king
+        if len(self.checks) > 1:
+            check_mask = 0
+        elif self.checks:
+            check_mask = self.checks[0]
+        else:
+            check_mask = ALL_SQUARES
+
+        if check_mask:
+            for piece in pieces:
+                if piece[0] == 'K':
+                    continue
+                squares = self.bitboards[piece]
+                move_function = self.moveFunctions[piece[0]]
+                piece_mask = check_mask & (pawn_target_mask if piece[0] == 'P' else target_mask)
+                while squares:
+                    lowest = squares & -squares
+                    sq = lowest.bit_length() - 1
+                    move_function(sq, moves, piece_mask & self.pins.get(sq, ALL_SQUARES))
+                    squares ^= lowest
+            # en passant removes two pawns from a rank at once, so it is checked by playing it
+            if self.enpassantPossible:
+                for i in range(len(moves) - 1, -1, -1):
+                    if moves[i] & FLAG_MASK == EN_PASSANT and not self.leaves_king_safe(moves[i]):
+                        del moves[i]
+
+        # the king can't step onto an attacked square, including ones behind it on the line of a checking slider,
+        # so the attack test is done with the king taken off the board
+        king_sq = king_row * 8 + king_col
+        occupied = (self.occupied['w'] | self.occupied['b']) ^ (1 << king_sq)
+        targets = KING_ATTACKS[king_sq] & ~self.occupied['w' if self.white_to_move else 'b'] & target_mask
+        safe = 0
+        while targets:
+            lowest = targets & -targets
+            if not self.is_attacked(lowest.bit_length() - 1, oppColour, occupied):
+                safe |= lowest
+            targets ^= lowest
+        self.get_king_moves(king_sq, moves, safe)
+        if captures_only or to_squares != ALL_SQUARES:
+            return moves
+
+        self.getCastleMoves(king_row, king_col, moves)
+
         if len(moves) == 0: # either checkmate or stalemate
-            if self.in_check():
+            if self.inCheck:
                 self.checkmate = True
             else:
                 self.stalemate = True
 
+        return moves
+
+    '''
+    One scan outward from the king of the side to move. Returns whether it is in check, the pinned pieces as
+    {square: squares the piece may still move to} and one entry per checking piece with the squares that stop that
+    check (capturing the checker or blocking between it and the king)
+    '''
+    def check_for_pins_and_checks(self):
+        pins = {}
+        checks = []
         if self.white_to_move:
-            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
+            colour, oppColour = 'w', 'b'
         else:
-            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
+            colour, oppColour = 'b', 'w'
+        king_sq = self.bitboards['K-' + colour].bit_length() - 1
+        ally = self.occupied[colour]
+        occupied = ally | self.occupied[oppColour]
+        queens = self.bitboards['Q-' + oppColour]
+        for rays, sliders in ((ROOK_RAYS, self.bitboards['R-' + oppColour] | queens),
+                              (BISHOP_RAYS, self.bitboards['B-' + oppColour] | queens)):
+            for ray_table, positive in rays:
+                ray = ray_table[king_sq]
+                blockers = ray & occupied
+                if not blockers:
+                    continue
+                first = (blockers & -blockers).bit_length() - 1 if positive else blockers.bit_length() - 1
+                if sliders >> first & 1:
+                    checks.append(ray ^ ray_table[first])
+                elif ally >> first & 1:
+                    blockers ^= 1 << first
+                    if blockers:
+                        second = (blockers & -blockers).bit_length() - 1 if positive else blockers.bit_length() - 1
+                        if sliders >> second & 1: # the allied piece is pinned to the king
+                            pins[first] = ray ^ ray_table[second]
+        knights = KNIGHT_ATTACKS[king_sq] & self.bitboards['N-' + oppColour]
+        if knights:
+            checks.append(knights)
+        pawns = PAWN_ATTACKS[colour][king_sq] & self.bitboards['P-' + oppColour]
+        if pawns:
+            checks.append(pawns)
+        return len(checks) > 0, pins, checks
 
-        self.enpassantPossible = tempEnpassantPosssible
-        self.currentCastlingRight = tempCastleRights
-
-        return moves
+    '''
+    Play the move and see if the mover's own king is attacked afterwards
+    '''
+    def leaves_king_safe(self, code):
+        self.push(code)
+        self.white_to_move = not self.white_to_move
+        in_check = self.in_check()
+        self.white_to_move = not self.white_to_move
+        self.pop()
+        return not in_check
 
     '''
     Determine if enemy can attack the square
     '''
     def squareUnderAttack(self, r, c):
-        self.white_to_move = not self.white_to_move # switch turns
-        oppMoves = self.get_all_possible_moves()
-        self.white_to_move = not self.white_to_move # switch turns back
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c: # square is under attack
-                return True
+        return self.is_attacked(r * 8 + c, 'b' if self.white_to_move else 'w')
+
+    '''
+    Determine if any piece of by_colour attacks sq. Works outward from sq: a piece attacks sq exactly when the same
+    kind of piece standing on sq would attack it, so this only looks at the squares that matter and stops at the
+    first attacker found. occupied can be given to test with pieces taken off the board
+    '''
+    def is_attacked(self, sq, by_colour, occupied=None):
+        bitboards = self.bitboards
+        if PAWN_ATTACKS['b' if by_colour == 'w' else 'w'][sq] & bitboards['P-' + by_colour]:
+            return True
+        if KNIGHT_ATTACKS[sq] & bitboards['N-' + by_colour]:
+            return True
+        if KING_ATTACKS[sq] & bitboards['K-' + by_colour]:
+            return True
+        if occupied is None:
+            occupied = self.occupied['w'] | self.occupied['b']
+        queens = bitboards['Q-' + by_colour]
+        for rays, sliders in ((ROOK_RAYS, (bitboards['R-' + by_colour] | queens) & ROOK_LINES[sq]),
+                              (BISHOP_RAYS, (bitboards['B-' + by_colour] | queens) & BISHOP_LINES[sq])):
+            if not sliders:
+                continue
+            for ray_table, positive in rays:
+                blockers = ray_table[sq] & occupied
+                if blockers:
+                    first = (blockers & -blockers).bit_length() - 1 if positive else blockers.bit_length() - 1
+                    if sliders >> first & 1:
+                        return True
         return False
 
+    '''
+    Bitboard of every square attacked by colour, whatever is standing on it. Pawns only count their diagonals
+    '''
+    def attacked_squares(self, colour, occupied=None):
+        bitboards = self.bitboards
+        if occupied is None:
+            occupied = self.occupied['w'] | self.occupied['b']
+        pawns = bitboards['P-' + colour]
+        if colour == 'w':
+            attacked = (pawns & ~FILE_A) >> 9 | (pawns & ~FILE_H) >> 7
+        else:
+            attacked = ((pawns & ~FILE_A) << 7 | (pawns & ~FILE_H) << 9) & ALL_SQUARES
+        for piece, table in (('N-', KNIGHT_ATTACKS), ('K-', KING_ATTACKS)):
+            pieces = bitboards[piece + colour]
+            while pieces:
+                lowest = pieces & -pieces
+                attacked |= table[lowest.bit_length() - 1]
+                pieces ^= lowest
+        queens = bitboards['Q-' + colour]
+        for sliders, rays in ((bitboards['R-' + colour] | queens, ROOK_RAYS),
+                              (bitboards['B-' + colour] | queens, BISHOP_RAYS)):
+            while sliders:
+                lowest = sliders & -sliders
+                attacked |= slider_attacks(lowest.bit_length() - 1, occupied, rays)
+                sliders ^= lowest
+        return attacked
+
     ''' 
     Determine if current player is in check
     '''
@@ -258,159 +755,96 @@ class GameState():
 
 
 
-    def get_pawn_moves(self, r, c, moves):
-
+    def get_pawn_moves(self, sq, moves, allowed=ALL_SQUARES):
         if self.white_to_move:
-            moveAmount = -1
+            moveAmount = -8
             startRow = 6
-            backRow = 0
+            promotionRow = 1 # pawns on this row promote with their next move
+            colour = 'w'
             oppColour = 'b'
-            king_row, king_col = self.whiteKingLocation
         else:
-            moveAmount = 1
+            moveAmount = 8
             startRow = 1
-            backRow = 7
+            promotionRow = 6
+            colour = 'b'
             oppColour = 'w'
-            king_row, king_col = self.blackKingLocation
-        isPawnPromotion = False
-
-
-        if self.board[r + moveAmount, c] == "---":
-            #if not piecePinned or pinDirection == (moveAmount, 0):
-                if r + moveAmount == backRow: # if piece gets to back rank then it's pawn promo
-                    isPawnPromotion = True
-                moves.append(Move((r, c), (r + moveAmount, c), self.board, is_pawn_promotion= isPawnPromotion))
-                if r == startRow and self.board[r + 2 * moveAmount, c] == "---":
-                    moves.append(Move((r, c), (r + 2 * moveAmount, c), self.board))
-        # captures
-        if (c - 1) >= 0: # capture to the left
-            #if not piecePinned or pinDirection == (moveAmount, -1):
-                if self.board[r + moveAmount, c - 1][2] == oppColour: #enemy piece to capture
-                    if r + moveAmount == backRow:
-                        isPawnPromotion = True
-                    moves.append(Move((r, c), (r + moveAmount, c - 1), self.board, is_pawn_promotion= isPawnPromotion))
-                if (r + moveAmount, c - 1) == self.enpassantPossible:
-                    attacking_piece = blocking_piece = False
-                    if king_row == r:
-                        if king_col < c: # king is left of pawn
-                            # inside between king and pawn; outside range between pawn border
-                            inside_range = range(king_col + 1, c)
-                            outside_range = range(c + 2, 8)
-                        else: # king right of pawn
-                            inside_range = range(king_col - 1, c + 1, - 1)
-                            outside_range = range(c - 1, -1, -1)
-                        for i in inside_range:
-                            if self.board[r, i] != "---":
-                                blocking_piece = True
-                        for i in outside_range:
-                            square = self.board[r, i]
-                            if square[2] == oppColour and (square[0] == 'R' or square[0] == 'Q'): # attacking piece
-                                attacking_piece = True
-                            elif square != "---":
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.append(Move((r, c), (r + moveAmount, c - 1), self.board, is_enpassant_move= True))
-        if (c + 1) <= 7: # capture to the right
-            #if not piecePinned or pinDirection == (moveAmount, 1):
-                if self.board[r + moveAmount, c + 1][2] == oppColour:
-                    moves.append(Move((r, c), (r + moveAmount, c + 1), self.board, is_pawn_promotion= isPawnPromotion))
-                if (r + moveAmount, c + 1) == self.enpassantPossible:
-                    moves.append(Move((r, c), (r + moveAmount, c + 1), self.board, is_enpassant_move= True))
-
-
-
-    '''
-    Get all rook moves for the rook located at row, col, and add these moves to the list
-    '''
-    def get_rook_moves(self, r, c, moves):
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
-        friendlyColour = 'w' if self.white_to_move else 'b'
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow <= 7 and 0 <= endCol <= 7:
-                    #if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                    endPiece = self.board[endRow, endCol]
-                    if endPiece == "---":
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    elif endPiece[2] != friendlyColour:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                        break
-                    else:
-                        break # friendly piece invalid
-                else:
-                    break # off board
-
-
-    '''
-    Get all bishop moves for the bishop located at row, col, and add these moves to the list
-    '''
-    def get_bishop_moves(self, r, c, moves):
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
-        friendlyColour = 'w' if self.white_to_move else 'b'
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    #if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                    endPiece = self.board[endRow, endCol]
-                    if endPiece == "---":
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    elif endPiece[2] != friendlyColour:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                        break
-                    else:
-                        break # friendly piece invalid
+        occupied = self.occupied['w'] | self.occupied['b']
+
+        # pawns never stand on the back rank, so one step forward is always on the board
+        end = sq + moveAmount
+        targets = PAWN_ATTACKS[colour][sq] & self.occupied[oppColour] # captures
+        if not occupied & (1 << end):
+            targets |= 1 << end
+            end += moveAmount
+            if sq >> 3 == startRow and not occupied & (1 << end) and allowed & (1 << end):
+                moves.append(sq | end << 6)
+        targets &= allowed
+        if sq >> 3 == promotionRow: # one move for each piece the pawn can promote to
+            while targets:
+                lowest = targets & -targets
+                code = sq | (lowest.bit_length() - 1) << 6 | PROMOTION
+                for piece in range(len(PROMOTION_PIECES)):
+                    moves.append(code | piece << 14)
+                targets ^= lowest
+        else:
+            self.add_moves(sq, targets, moves)
+        # en passant ignores allowed, generate_moves plays it to check it is legal
+        if self.enpassantPossible:
+            ep_row, ep_col = self.enpassantPossible
+            end = ep_row * 8 + ep_col
+            if PAWN_ATTACKS[colour][sq] & (1 << end):
+                moves.append(sq | end << 6 | EN_PASSANT)
 
-                else:
-                    break # off board
 
     '''
-    Get all knight moves for the knight located at row, col, and add these moves to the list
+    Add a move from sq to every square in the targets bitboard
     '''
-    def get_knight_moves(self, r, c, moves):
+    def add_moves(self, sq, targets, moves):
+        while targets:
+            lowest = targets & -targets
+            moves.append(sq | (lowest.bit_length() - 1) << 6)
+            targets ^= lowest
 
-        knight_moves = ((-2, -1), (-2, 1), (2, -1), (2, 1),
-                      (-1, -2), (-1, 2), (1, -2), (1, 2))
-        friendlyColour = 'w' if self.white_to_move else 'b'
-        for m in knight_moves:
-            endRow = r + m[0]
-            endCol = c + m[1]
-            if 0 <= endRow <= 7 and 0 <= endCol <= 7:
-                #if not piecePinned:
-                    endPiece = self.board[endRow, endCol]
-                    if endPiece[2] != friendlyColour:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
+
+    '''
+    Get all rook moves for the rook located at sq, and add these moves to the list
+    '''
+    def get_rook_moves(self, sq, moves, allowed=ALL_SQUARES):
+        friendly = self.occupied['w' if self.white_to_move else 'b']
+        attacks = slider_attacks(sq, self.occupied['w'] | self.occupied['b'], ROOK_RAYS)
+        self.add_moves(sq, attacks & ~friendly & allowed, moves)
 
 
     '''
-    Get all king moves for the king located at row, col, and add these moves to the list
+    Get all bishop moves for the bishop located at sq, and add these moves to the list
     '''
-    def get_king_moves(self, r, c, moves):
-        king_moves = ((-1, -1), (-1, 0), (-1, 1), (1, -1),
-                 (1, 1), (1, 0), (0, -1), (0, 1))
-        friendlyColour = 'w' if self.white_to_move else 'b'
-        for i in range(8):
-            endRow = r + king_moves[i][0]
-            endCol = c + king_moves[i][1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow, endCol]
-                if endPiece[2] != friendlyColour:
+    def get_bishop_moves(self, sq, moves, allowed=ALL_SQUARES):
+        friendly = self.occupied['w' if self.white_to_move else 'b']
+        attacks = slider_attacks(sq, self.occupied['w'] | self.occupied['b'], BISHOP_RAYS)
+        self.add_moves(sq, attacks & ~friendly & allowed, moves)
 
-                    moves.append(Move((r, c), (endRow, endCol), self.board))
+    '''
+    Get all knight moves for the knight located at sq, and add these moves to the list
+    '''
+    def get_knight_moves(self, sq, moves, allowed=ALL_SQUARES):
+        friendly = self.occupied['w' if self.white_to_move else 'b']
+        self.add_moves(sq, KNIGHT_ATTACKS[sq] & ~friendly & allowed, moves)
 
 
+    '''
+    Get all king moves for the king located at sq, and add these moves to the list
+    '''
+    def get_king_moves(self, sq, moves, allowed=ALL_SQUARES):
+        friendly = self.occupied['w' if self.white_to_move else 'b']
+        self.add_moves(sq, KING_ATTACKS[sq] & ~friendly & allowed, moves)
 
 
     '''
     Generate all valid castle moves for king at (r, c) and add them to the valid list of moves
     '''
     def getCastleMoves(self, row, col, moves):
-        #in_check = self.squareUnderAttack(row, col)
         # get the castle moves for the king
-        if self.squareUnderAttack(row, col):
+        if self.inCheck:
             return  # can't castle while in check
 
         if (self.white_to_move and self.currentCastlingRight.wks) or (not self.white_to_move and self.currentCastlingRight.bks):
@@ -419,21 +853,25 @@ class GameState():
             self.getQueensideCastleMoves(row, col, moves)
 
     def getKingsideCastleMoves(self, row, col, moves):
-        if self.board[row, col + 1] == '--' and self.board[row, col + 2] == '---':
+        sq = row * 8 + col
+        between = (1 << (sq + 1)) | (1 << (sq + 2))
+        if not (self.occupied['w'] | self.occupied['b']) & between:
             if not self.squareUnderAttack(row, col + 1) and not self.squareUnderAttack(row, col + 2):
-                moves.append(Move((row, col), (row, col + 2), self.board, is_castle_move=True))
+                moves.append(sq | (sq + 2) << 6 | CASTLE)
 
     def getQueensideCastleMoves(self, row, col, moves):
-        if self.board[row, col - 1] == '--' and self.board[row, col - 2] == '---' and self.board[row, col - 3] == '---':
+        sq = row * 8 + col
+        between = (1 << (sq - 1)) | (1 << (sq - 2)) | (1 << (sq - 3))
+        if not (self.occupied['w'] | self.occupied['b']) & between:
             if not self.squareUnderAttack(row, col - 1) and not self.squareUnderAttack(row, col - 2):
-                moves.append(Move((row, col), (row, col - 2), self.board, is_castle_move=True))
+                moves.append(sq | (sq - 2) << 6 | CASTLE)
 
     '''
-    Get all queen moves for the queen located at row, col, and add these moves to the list
+    Get all queen moves for the queen located at sq, and add these moves to the list
     '''
-    def get_queen_moves(self, r, c, moves):
-        self.get_rook_moves(r, c, moves)
-        self.get_bishop_moves(r, c, moves)
+    def get_queen_moves(self, sq, moves, allowed=ALL_SQUARES):
+        self.get_rook_moves(sq, moves, allowed)
+        self.get_bishop_moves(sq, moves, allowed)
 
 class CastleRights():
     def __init__(self, wks, bks, wqs, bqs):
@@ -442,7 +880,21 @@ class CastleRights():
         self.wqs = wqs
         self.bqs = bqs
 
+    '''
+    The four rights packed into a number from 0 to 15
+    '''
+    def index(self):
+        return self.wks | self.bks << 1 | self.wqs << 2 | self.bqs << 3
+
+'''
+Full description of a move for the GUI and move notation, built from the packed move code
+'''
 class Move:
+    # slots instead of a __dict__ per move
+    __slots__ = ('startRow', 'startCol', 'endRow', 'endCol', 'pieceMoved', 'pieceCaptured',
+                 'isPawnPromotion', 'promotedPiece', 'isEnpassantMove', 'isCastleMove', 'isCapture',
+                 'is_check', 'is_checkmate', 'code', 'moveID', 'san')
+
     # maps keys to values
     # key : value
 
@@ -452,18 +904,19 @@ class Move:
     colsToTiles = {v: k for k, v in tilesToCols.items()}
 
     def __init__(self, StartSq, endSq, board, is_pawn_promotion = False, is_enpassant_move = False,
-                 is_castle_move = False, is_check = False, is_checkmate = False):
+                 is_castle_move = False, is_check = False, is_checkmate = False, promotion_piece = 'Q'):
         self.startRow = StartSq[0]
         self.startCol = StartSq[1]
         self.endRow = endSq[0]
         self.endCol = endSq[1]
-        self.board = board
         self.pieceMoved = board[self.startRow, self.startCol]
         self.pieceCaptured = board[self.endRow, self.endCol]
         # pawn promo
         self.isPawnPromotion = is_pawn_promotion
         if (self.pieceMoved == "P-w" and self.endRow == 0) or (self.pieceMoved == "P-b" and self.endRow == 7):
             self.isPawnPromotion = True
+        # promotion_piece is the piece letter, promotedPiece the full piece string such as "N-w"
+        self.promotedPiece = promotion_piece + self.pieceMoved[1:] if self.isPawnPromotion else None
 
         # en passant
         self.isEnpassantMove = is_enpassant_move
@@ -477,9 +930,32 @@ class Move:
 
         self.is_check = is_check
         self.is_checkmate = is_checkmate
+        self.san = None # set by GameState.make_move
 
         self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
 
+        self.code = self.startRow * 8 + self.startCol | (self.endRow * 8 + self.endCol) << 6
+        if self.isPawnPromotion:
+            # promotions to different pieces are different moves
+            self.moveID += PROMOTION_PIECES.index(promotion_piece) * 10000
+            self.code |= PROMOTION | PROMOTION_PIECES.index(promotion_piece) << 14
+        elif self.isEnpassantMove:
+            self.code |= EN_PASSANT
+        elif self.isCastleMove:
+            self.code |= CASTLE
+
+    '''
+    Build the Move for a packed move code on the given board (before the move is made)
+    '''
+    @classmethod
+    def from_code(cls, code, board):
+        start = code & 63
+        end = code >> 6 & 63
+        flag = code & FLAG_MASK
+        move = cls((start >> 3, start & 7), (end >> 3, end & 7), board, is_enpassant_move=flag == EN_PASSANT,
+                   is_castle_move=flag == CASTLE, promotion_piece=PROMOTION_PIECES[code >> 14])
+        move.code = code
+        return move
 
     '''
     Overriding the equals method
@@ -494,61 +970,9 @@ class Move:
     def get_rank_tile(self, r, c):
         return self.colsToTiles[c] + self.rowsToRanks[r]
 
-    # override the  str() function
+    '''
+    The move in standard algebraic notation once it has been made with GameState.make_move, coordinate notation
+    before that
+    '''
     def __str__(self):
-        # castle move
-        if self.isCastleMove:
-            return "O-O" if self.endCol == 6 else "O-O-O"
-            #"O-O" # kingside castle
-            #"O-O-O" # queenside castle
-
-        end_square = self.get_rank_tile(self.endRow, self.endCol)
-
-        # pawn moves
-        if self.pieceMoved[0] == 'P':
-            if self.isCapture:
-                return self.colsToTiles[self.startCol] + "x" + end_square
-            else:
-                return end_square
-
-        # pawn promotion
-        if self.isPawnPromotion:
-            return self.colsToTiles[self.startCol] + "x" + end_square
-
-
-        move_string = self.pieceMoved[0]
-        same_type_pieces = self.get_same_type_pieces(self.pieceMoved[0])
-        if len(same_type_pieces) > 1:
-            move_string += self.get_disambiguation_string(same_type_pieces)
-        if self.isCapture:
-            move_string += "x"
-        move_string += end_square
-
-
-
-        if self.is_check:
-            move_string += "+"
-        elif self.is_checkmate:
-            return self.colsToTiles[self.startCol] + "#" + end_square
-
-        return move_string
-
-    def get_rank_file(self, r, c):
-        return self.colsToTiles[c] + self.rowsToRanks[r]
-
-    def get_same_type_pieces(self, piece_type):
-        same_type_pieces = []
-        for r in range(len(self.board)):
-            for c in range(len(self.board[r])):
-                if self.board[r, c][0] == piece_type and (r, c) != (self.startRow, self.startCol):
-                    same_type_pieces.append((r, c))
-        return same_type_pieces
-
-    def get_disambiguation_string(self, same_type_pieces):
-        disambiguation_string = ""
-        for piece in same_type_pieces:
-            if piece[1] == self.startCol:
-                disambiguation_string += self.colsToTiles[self.startCol]
-            else:
-                disambiguation_string += self.rowsToRanks[self.startRow]
-        return disambiguation_string
\ No newline at end of file
+        return self.san if self.san is not None else self.get_chess_notation()
\ No newline at end of file
@@ -3,8 +3,8 @@ Main driver file. Responsible for handling user input and displaying current Gam
 """
 
 import pygame as p
-from Chess import ChessEngine, ChessAI
-from multiprocessing import Process, Queue
+from Chess import ChessEngine, ChessAI, Pgn
+from Chess.AIWorker import AIWorker
 from tkinter import *
 
 BOARD_WIDTH = BOARD_HEIGHT = 512
@@ -13,8 +13,15 @@ MOVE_LOG_PANEL_HEIGHT = BOARD_HEIGHT
 DIMENSION = 8
 SQ_SIZE = BOARD_HEIGHT // DIMENSION
 MAX_FPS = 15
+MOVES_PER_LINE = 3 # move pairs on each line of the move log
+LOG_PADDING = 5
+LINE_SPACING = 2
+PONDER = True # let the AI think on the human's time, searching the reply it expects
+SAVE_GAMES = None # PGN file finished games are added to, e.g. "games.pgn"
 IMAGES = {}
 COLOURS = (p.Color("grey"), p.Color("steel blue"))
+SELECTED = "selected" # highlight of the square of the piece picked up
+TARGET = "target" # highlight of a square it can move to
 
 '''
 Initialize a global dictionary of images. This will be called exactly once in the main
@@ -26,6 +33,29 @@ def load_images():
 
         IMAGES[piece] = p.transform.scale(p.image.load("images/" + piece + ".svg"), (SQ_SIZE * 2.7, SQ_SIZE * 2.7))
 
+'''
+Ask the player which piece to promote a pawn to. Returns the piece letter, a queen if the window is just closed
+'''
+def choose_promotion_piece():
+    choice = 'Q'
+    promo_window = Tk()
+    promo_window.title("Choose Pawn Promotion")
+    promo_window.geometry("200x150")
+
+    def promote_piece(piece):
+        nonlocal choice
+        choice = piece
+        promo_window.destroy()
+
+    Label(promo_window, text="Pawn Promotion").pack()
+    Button(promo_window, text="Queen", command=lambda: promote_piece("Q")).pack(fill=X)
+    Button(promo_window, text="Rook", command=lambda: promote_piece("R")).pack(fill=X)
+    Button(promo_window, text="Bishop", command=lambda: promote_piece("B")).pack(fill=X)
+    Button(promo_window, text="Knight", command=lambda: promote_piece("N")).pack(fill=X)
+
+    promo_window.mainloop()
+    return choice
+
 '''
 Main driver for our code. This will handle user input and updating graphics
 '''
@@ -64,7 +94,8 @@ def main():
     screen = p.display.set_mode((BOARD_WIDTH + MOVE_LOG_PANEL_WIDTH, BOARD_HEIGHT))
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
-    move_log_font = p.font.SysFont("Arial", 14, False, False)
+    move_log_panel = MoveLogPanel(p.font.SysFont("Arial", 14, False, False))
+    board_renderer = BoardRenderer()
     gs = ChessEngine.GameState()
     validMoves = gs.get_valid_moves()
     moveMade = False # flag variable for when move is made
@@ -82,7 +113,9 @@ def main():
 
     game_over = False
     ai_thinking = False
-    chess_ai_process = None
+    ai = AIWorker() # one AI process for the whole game, it keeps what it learned between moves
+    pondering = False
+    ponder_move = None
     move_undone = False
 
     while no_choice_made:
@@ -93,6 +126,12 @@ def main():
         for e in p.event.get():
             if e.type == p.QUIT:
                 running = False
+            elif e.type in (p.VIDEOEXPOSE, p.WINDOWEXPOSED): # the window was covered, draw all of it again
+                board_renderer.invalidate()
+                move_log_panel.invalidate()
+            elif e.type == p.MOUSEWHEEL:
+                if move_log_panel.rect.collidepoint(p.mouse.get_pos()):
+                    move_log_panel.scroll_by(e.y)
             # mouse handler
             elif e.type == p.MOUSEBUTTONDOWN:
                 if not game_over:
@@ -107,6 +146,9 @@ def main():
                         player_clicks.append(sq_selected)
                     if len(player_clicks) == 2 and human_turn:
                         move = ChessEngine.Move(player_clicks[0], player_clicks[1], gs.board)
+                        if move.isPawnPromotion and move in validMoves: # only ask once the move is known to be legal
+                            move = ChessEngine.Move(player_clicks[0], player_clicks[1], gs.board,
+                                                    promotion_piece=choose_promotion_piece())
                         print(move.get_chess_notation())
 
                         for i in range(len(validMoves)):
@@ -126,11 +168,15 @@ def main():
                     moveMade = True
                     animate = False
                     game_over = False
-                    if ai_thinking:
-                         chess_ai_process.terminate()
+                    if ai_thinking or pondering:
+                         ai.stop()
                          ai_thinking = False
+                         pondering = False
                     move_undone = True
                 if e.key == p.K_r: # reset the board when 'r' is pressed
+                    ai.new_game() # stops the search or pondering too
+                    ai_thinking = False
+                    pondering = False
                     gs = ChessEngine.GameState()
                     validMoves = gs.get_valid_moves()
                     sq_selected = ()
@@ -144,12 +190,18 @@ def main():
         if not game_over and not human_turn and not move_undone:
             if not ai_thinking:
                 ai_thinking = True
-                return_queue = Queue()
-                chess_ai_process = Process(target=ChessAI.find_best_move, args=(gs, validMoves, return_queue))
-                chess_ai_process.start() # call find_best_move(gs, valid_moves, return_queue)
-            if not chess_ai_process.is_alive():
-                ai_move = return_queue.get()
-                #ai_move = ChessAI.find_best_move(gs, validMoves)
+                if pondering and gs.moveLog[-1].code == ponder_move:
+                    ai.ponder_hit() # the human played the expected reply, the ponder search carries on
+                else:
+                    if pondering:
+                        ai.stop()
+                    ai.set_position(None, [move.code for move in gs.moveLog])
+                    ai.go()
+                pondering = False
+            result = ai.get_result()
+            if result is not None:
+                ai_move, ponder_move = result
+                ai_move = next((move for move in validMoves if move.code == ai_move), None)
                 if ai_move is None:
                     ai_move = ChessAI.find_random_move(validMoves)
                 gs.make_move(ai_move)
@@ -157,19 +209,32 @@ def main():
                 animate = True
                 ai_thinking = False
                 print("Done thinking")
+                human_next = (gs.white_to_move and player_one) or (not gs.white_to_move and player_two)
+                if PONDER and human_next and ponder_move is not None:
+                    # think about the position after the reply the AI expects while the human thinks
+                    ai.set_position(None, [move.code for move in gs.moveLog] + [ponder_move])
+                    ai.go(ponder=True)
+                    pondering = True
 
 
         if moveMade:
             if animate:
-                animate_move(gs.moveLog[-1], screen, gs.board, clock)
+                animate_move(gs.moveLog[-1], screen, gs.board, clock, board_renderer)
             validMoves = gs.get_valid_moves()
             moveMade = False
             animate = False
             move_undone = False
 
-        draw_game_state(screen, gs, validMoves, sq_selected, move_log_font)
-
-        if gs.checkmate:
+        text = None
+        if gs.checkmate or gs.stalemate:
+            if not game_over:
+                if ai_thinking or pondering: # a ponder search has no deadline, it would run until the window closes
+                    ai.stop()
+                    ai_thinking = False
+                    pondering = False
+                if SAVE_GAMES is not None:
+                    players = {"White": "Human" if player_one else "AI", "Black": "Human" if player_two else "AI"}
+                    Pgn.write_games(SAVE_GAMES, [Pgn.PgnGame.from_game_state(gs, players)])
             game_over = True
             if gs.stalemate:
                 text = 'Stalemate'
@@ -179,40 +244,38 @@ def main():
                 else:
                     text = 'White wins by checkmate'
 
-            draw_end_game_text(screen, text)
-
+        # only the parts of the window that changed are drawn and sent to the display
+        p.display.update(draw_game_state(screen, gs, validMoves, sq_selected, board_renderer, move_log_panel, text))
         clock.tick(MAX_FPS)
-        p.display.flip()
+
+    ai.close()
 
 
 
 '''
-Highlight square selcted and moves for piece selected
+Highlights for the square selected and the squares the piece on it can move to, as {(row, col): SELECTED or TARGET}.
+A square is highlighted once however many moves end on it, such as the four promotions
 '''
-def highlight_squares(screen, gs, validMoves, sq_selected):
+def highlight_squares(gs, validMoves, sq_selected):
+    highlights = {}
     if sq_selected != ():
         r, c = sq_selected
         if gs.board[r][c][2] == ('w' if gs.white_to_move else 'b'): # sqSelected is a piece that can be moved
-            # highlight selected squares
-            s = p.Surface((SQ_SIZE, SQ_SIZE))
-            s.set_alpha(100) # transparency value
-            s.fill(p.Color('crimson'))
-            screen.blit(s, (c * SQ_SIZE, r * SQ_SIZE))
-            # highlight moves from that square
-            s.fill(p.Color('yellow'))
+            highlights[sq_selected] = SELECTED
             for move in validMoves:
                 if move.startRow == r and move.startCol == c:
-                    screen.blit(s, (move.endCol * SQ_SIZE, move.endRow * SQ_SIZE))
+                    highlights[(move.endRow, move.endCol)] = TARGET
+    return highlights
 
 
 '''
-Responsible for all graphics within a current game state
+Responsible for all graphics within a current game state. Returns the rectangles of the window that were drawn
 '''
-def draw_game_state(screen, gs, validMoves, sq_selected, move_log_font):
-    draw_board(screen)
-    highlight_squares(screen, gs, validMoves, sq_selected)
-    draw_pieces(screen, gs.board)
-    draw_move_log(screen, gs, move_log_font)
+def draw_game_state(screen, gs, validMoves, sq_selected, board_renderer, move_log_panel, text=None):
+    rects = board_renderer.draw(screen, gs.board, highlight_squares(gs, validMoves, sq_selected), text)
+    if move_log_panel.draw(screen, gs.moveLog):
+        rects.append(move_log_panel.rect)
+    return rects
 
 
 '''
@@ -235,46 +298,171 @@ def draw_pieces(screen, board):
             if piece != "---": # not empty square
                 screen.blit(IMAGES[piece], p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE))
 
+
+def highlight_surface(colour):
+    surface = p.Surface((SQ_SIZE, SQ_SIZE))
+    surface.set_alpha(100) # transparency value
+    surface.fill(p.Color(colour))
+    return surface
+
+
+'''
+Draws the board where it changed. The squares are drawn once onto a background surface, and the piece and highlight
+each square shows are remembered between frames, so a frame only redraws the squares where one of them changed.
+Piece images are bigger than a square and spill onto their neighbours, so each changed area is drawn again with
+everything that overlaps it, in the usual order and clipped to the area
+'''
+class BoardRenderer():
+    def __init__(self):
+        self.rect = p.Rect(0, 0, BOARD_WIDTH, BOARD_HEIGHT)
+        self.background = p.Surface(self.rect.size)
+        draw_board(self.background)
+        self.selected = highlight_surface('crimson')
+        self.target = highlight_surface('yellow')
+        self.shown = None # (piece, highlight) of each square as it is on the screen, None to draw everything
+        self.text = None
+
+    def invalidate(self):
+        self.shown = None
+
+    def square_rect(self, sq):
+        return p.Rect(sq % DIMENSION * SQ_SIZE, sq // DIMENSION * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+
+    '''
+    The part of the board a change on square sq touches: the square and the image of the piece standing on it
+    '''
+    def square_area(self, sq, piece):
+        area = self.square_rect(sq)
+        if piece != "---":
+            area.union_ip(IMAGES[piece].get_rect(topleft=area.topleft))
+        return area.clip(self.rect)
+
+    '''
+    Bring the board on the screen up to date and return the rectangles that were drawn. highlights come from
+    highlight_squares, text is written across the board when the game is over
+    '''
+    def draw(self, screen, board, highlights, text=None):
+        squares = [(board[r][c], highlights.get((r, c))) for r in range(DIMENSION) for c in range(DIMENSION)]
+        if self.shown is None or text != self.text or (text is not None and squares != self.shown):
+            dirty = [self.rect]
+        else:
+            dirty = []
+            for sq in range(DIMENSION * DIMENSION):
+                if squares[sq] != self.shown[sq]:
+                    dirty.append(self.square_area(sq, squares[sq][0]))
+                    dirty.append(self.square_area(sq, self.shown[sq][0])) # where the old piece spilled over
+        for area in dirty:
+            self.draw_area(screen, area, squares)
+        if text is not None and dirty:
+            draw_end_game_text(screen, text)
+        self.shown = squares
+        self.text = text
+        return dirty
+
+    def draw_area(self, screen, area, squares):
+        screen.set_clip(area)
+        screen.blit(self.background, area, area)
+        for sq, (_, highlight) in enumerate(squares):
+            if highlight is not None and self.square_rect(sq).colliderect(area):
+                screen.blit(self.selected if highlight == SELECTED else self.target, self.square_rect(sq))
+        for sq, (piece, _) in enumerate(squares):
+            if piece != "---" and self.square_area(sq, piece).colliderect(area):
+                screen.blit(IMAGES[piece], self.square_rect(sq))
+        screen.set_clip(None)
+
+
 '''
-Draws move log
+The move log panel beside the board. Each line of text is rendered once and kept: a new move only re-renders the
+line it lands on, and an undo only the lines from the first move taken back. A new game (a new move list) starts the
+panel over. The panel shows the latest lines and can be scrolled back with the mouse wheel, and is only redrawn when
+it changed, so drawing it costs the same however long the game is
 '''
-def draw_move_log(screen, gs, font):
-
-    move_log_rect = p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)
-    p.draw.rect(screen, p.Color("black"), move_log_rect)
-    move_log = gs.moveLog
-    move_texts = []
-    for i in range(0, len(move_log), 2):
-        move_string = str(i // 2) + ". " + str(move_log[i]) + " "
-        if i + 1 < len(move_log): # make sure black made a move
-            move_string += str(move_log[i + 1]) + "  "
-        move_texts.append(move_string)
-    moves_per_row = 3
-    padding = 5
-    line_spacing = 2
-    text_y = padding
-    for i in range(0, len(move_texts), moves_per_row):
+class MoveLogPanel():
+    def __init__(self, font):
+        self.font = font
+        self.rect = p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)
+        self.surface = p.Surface(self.rect.size)
+        self.line_height = font.get_linesize() + LINE_SPACING
+        self.visible_lines = max(1, (self.rect.height - 2 * LOG_PADDING) // self.line_height)
+        self.move_log = None # the list the lines were made from
+        self.moves = [] # the moves the lines show
+        self.lines = [] # rendered surface of each line
+        self.scroll = 0 # lines scrolled back from the latest
+        self.changed = True
+
+    '''
+    Bring the lines up to date with move_log. Lines before the first move that differs are kept as they are
+    '''
+    def update(self, move_log):
+        if move_log is not self.move_log:
+            self.move_log = move_log
+            self.moves = []
+            self.lines = []
+        if len(move_log) == len(self.moves) and (not self.moves or move_log[-1] is self.moves[-1]):
+            return
+        same = min(len(move_log), len(self.moves)) # moves at the start both have, found from the end
+        while same and move_log[same - 1] is not self.moves[same - 1]:
+            same -= 1
+        del self.moves[same:]
+        self.moves.extend(move_log[same:])
+        plies_per_line = 2 * MOVES_PER_LINE
+        first_line = same // plies_per_line
+        del self.lines[first_line:]
+        for line in range(first_line, (len(self.moves) + plies_per_line - 1) // plies_per_line):
+            self.lines.append(self.font.render(self.line_text(line), True, p.Color('white')))
+        self.scroll = 0
+        self.changed = True
+
+    def line_text(self, line):
         text = ""
-        for j in range(moves_per_row):
-            if i + j < len(move_texts):
-                text += move_texts[i + j]
-        textObject = font.render(text, True, p.Color('white'))
-        textLocation = move_log_rect.move(padding, text_y)
-        screen.blit(textObject, textLocation)
-        text_y += textObject.get_height() + line_spacing
+        for ply in range(line * 2 * MOVES_PER_LINE, min((line + 1) * 2 * MOVES_PER_LINE, len(self.moves)), 2):
+            text += str(ply // 2 + 1) + ". " + str(self.moves[ply]) + " "
+            if ply + 1 < len(self.moves): # make sure black made a move
+                text += str(self.moves[ply + 1]) + "  "
+        return text
+
+    '''
+    Scroll lines back (positive) or forward (negative), staying between the first and the latest line
+    '''
+    def scroll_by(self, lines):
+        scroll = min(max(self.scroll + lines, 0), max(len(self.lines) - self.visible_lines, 0))
+        if scroll != self.scroll:
+            self.scroll = scroll
+            self.changed = True
+
+    def invalidate(self):
+        self.changed = True
+
+    '''
+    Draw the panel if it changed since the last draw. Returns True if it was drawn
+    '''
+    def draw(self, screen, move_log):
+        self.update(move_log)
+        if not self.changed:
+            return False
+        self.surface.fill(p.Color("black"))
+        last = len(self.lines) - self.scroll
+        text_y = LOG_PADDING
+        for line in self.lines[max(last - self.visible_lines, 0):last]:
+            self.surface.blit(line, (LOG_PADDING, text_y))
+            text_y += self.line_height
+        screen.blit(self.surface, self.rect)
+        self.changed = False
+        return True
 
 
 '''
 Animating a move
 '''
-def animate_move(move, screen, board, clock):
+def animate_move(move, screen, board, clock, board_renderer):
     dR = move.endRow - move.startRow
     dC = move.endCol - move.startCol
     framesPerSq = 10 # frames to move one square
     frameCount = (abs(dR) + abs(dC)) * framesPerSq
     for frame in range(frameCount + 1):
         r, c = (move.startRow + dR * frame / frameCount, move.startCol + dC * frame / frameCount)
-        draw_board(screen)
+        screen.set_clip(board_renderer.rect) # pieces spilling over the edge stay off the move log
+        screen.blit(board_renderer.background, (0, 0))
         draw_pieces(screen, board)
 
         colour = COLOURS[(move.endRow + move.endCol) % 2]
@@ -292,8 +480,10 @@ def animate_move(move, screen, board, clock):
             screen.blit(IMAGES[move.pieceCaptured], endSquare)
         # draw moving piece
         screen.blit(IMAGES[move.pieceMoved], p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE))
-        p.display.flip()
+        screen.set_clip(None)
+        p.display.update(board_renderer.rect)
         clock.tick(60)
+    board_renderer.invalidate()
 
 
 def draw_end_game_text(screen, text):
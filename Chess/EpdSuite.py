@@ -0,0 +1,142 @@
+"""
+Runs EPD test suites such as WAC or STS. Each record is a position followed by operations, and its "bm" (best move)
+or "am" (avoid move) operation says which moves solve it. The positions are spread over a pool of processes, each
+searching one position at a time from a fresh start. Results are printed as one JSON object per line, in file order,
+followed by a summary object.
+
+Run from the repository root:
+    python -m Chess.EpdSuite wac.epd                        2 seconds a position, one process per core
+    python -m Chess.EpdSuite wac.epd --depth 5 --processes 4 --set USE_LMR=False
+"""
+import argparse
+import json
+import re
+import time
+from multiprocessing import Pool, cpu_count
+from Chess import ChessEngine, ChessAI
+
+OPERATION = re.compile(r'\s*(\w+)((?:\s+(?:"[^"]*"|[^\s;"]+))*)\s*;')
+OPERAND = re.compile(r'"([^"]*)"|([^\s;"]+)')
+
+
+'''
+Split an EPD record into (FEN, {opcode: [operands]}). The halfmove clock and fullmove number come from the hmvc and
+fmvn operations when they are there
+'''
+def parse_epd(line):
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError("bad EPD record: " + line.strip())
+    operations = {}
+    for opcode, operands in OPERATION.findall(fields[4] if len(fields) > 4 else ""):
+        operations[opcode] = [quoted or plain for quoted, plain in OPERAND.findall(operands)]
+    fen = " ".join(fields[:4] + [operations.get("hmvc", ["0"])[0], operations.get("fmvn", ["1"])[0]])
+    return fen, operations
+
+
+'''
+[(FEN, operations, error)] for the records of the suite in file order. A record that can't be split keeps its line
+in place of the FEN and says why in error, which is None for the others
+'''
+def read_suite(path):
+    records = []
+    with open(path) as suite:
+        for line in suite:
+            if not line.strip() or line.startswith("#"):
+                continue
+            try:
+                records.append(parse_epd(line) + (None,))
+            except ValueError as error:
+                records.append((line.strip(), {}, str(error)))
+    return records
+
+
+'''
+Search one position and return its result as a dict. task is (number, FEN, operations, error, seconds, depth).
+A record with a read error, a bad FEN or bm / am moves that aren't legal gets an "error" instead of a search
+'''
+def solve(task):
+    number, fen, operations, error, budget, depth = task
+    result = {"number": number, "id": operations.get("id", [str(number)])[0], "fen": fen}
+    if error is not None:
+        result["error"] = error
+        return result
+    try:
+        gs = ChessEngine.GameState(fen)
+        best_moves = [gs.parse_san(san) for san in operations.get("bm", [])]
+        avoid_moves = [gs.parse_san(san) for san in operations.get("am", [])]
+    except (ValueError, KeyError, IndexError) as error:
+        result["error"] = str(error)
+        return result
+
+    reached = [] # depth of every finished iteration
+    ChessAI.new_game()
+    start = time.perf_counter()
+    move, score = ChessAI.search(gs, gs.generate_moves([]), budget, max_depth=depth, verbose=False,
+                                 report=lambda reached_depth, *_: reached.append(reached_depth))
+    seconds = time.perf_counter() - start
+    result.update({
+        "move": ChessEngine.Move.from_code(move, gs.board).get_chess_notation() if move is not None else None,
+        "bm": operations.get("bm", []),
+        "am": operations.get("am", []),
+        "solved": move is not None and (not best_moves or move in best_moves) and move not in avoid_moves,
+        "score": score,
+        "depth": reached[-1] if reached else 0,
+        "nodes": ChessAI.counter,
+        "seconds": round(seconds, 3),
+        "nodes_per_second": round(ChessAI.counter / seconds) if seconds else 0,
+    })
+    return result
+
+
+'''
+Search every position of the suite with processes worker processes and print the results. Returns the summary
+'''
+def run(path, budget=None, depth=ChessAI.MAX_DEPTH, processes=None, settings=()):
+    tasks = [(number, fen, operations, error, budget, depth)
+             for number, (fen, operations, error) in enumerate(read_suite(path), 1)]
+    start = time.perf_counter()
+    results = []
+    with Pool(processes or cpu_count(), initializer=ChessAI.apply_settings, initargs=(list(settings),)) as pool:
+        for result in pool.imap(solve, tasks):
+            print(json.dumps(result), flush=True)
+            results.append(result)
+    searched = [result for result in results if "error" not in result]
+    nodes = sum(result["nodes"] for result in searched)
+    search_time = sum(result["seconds"] for result in searched)
+    summary = {
+        "summary": path,
+        "positions": len(results),
+        "errors": len(results) - len(searched),
+        "solved": sum(result["solved"] for result in searched),
+        "solve_rate": round(sum(result["solved"] for result in searched) / len(searched), 4) if searched else 0,
+        "nodes": nodes,
+        "search_seconds": round(search_time, 3),
+        "nodes_per_second": round(nodes / search_time) if search_time else 0,
+        "seconds_per_position": round(search_time / len(searched), 3) if searched else 0,
+        "wall_seconds": round(time.perf_counter() - start, 3),
+    }
+    print(json.dumps(summary))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an EPD test suite and report the solve rate")
+    parser.add_argument("suite", help="EPD file")
+    parser.add_argument("--time", type=float, help="seconds per position (default: 2, or no limit with --depth)")
+    parser.add_argument("--depth", type=int, help="deepest iteration to search (default: no limit)")
+    parser.add_argument("--processes", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="change a ChessAI setting for this run, e.g. USE_PVS=False")
+    args = parser.parse_args()
+
+    try:
+        settings = ChessAI.parse_settings(args.set)
+    except ValueError as error:
+        parser.error(str(error))
+    budget = args.time if args.time is not None or args.depth is not None else 2.0
+    run(args.suite, budget, args.depth or ChessAI.MAX_DEPTH, args.processes, settings)
+
+
+if __name__ == "__main__":
+    main()
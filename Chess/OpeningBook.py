@@ -0,0 +1,126 @@
+"""
+Opening book. The book file is a list of 16 byte entries laid out like a Polyglot book: position key (8 bytes), move
+(2 bytes), weight (2 bytes) and 4 unused bytes, big-endian and sorted by key. The key is the ChessEngine Zobrist key
+and the move is the packed move code, so Polyglot books can't be read directly and a book has to be built again if
+the Zobrist tables change.
+The file is memory-mapped and searched with a binary search, so opening a book costs nothing and a lookup reads a
+handful of entries.
+
+Run from the repository root:
+    python -m Chess.OpeningBook build games.pgn Chess/book.bin      build a book from a PGN collection
+    python -m Chess.OpeningBook show Chess/book.bin [--fen "<FEN>"]  list the book moves for a position
+"""
+import argparse
+import mmap
+import random
+import struct
+from Chess import ChessEngine, Pgn
+
+ENTRY = struct.Struct(">QHHI")
+KEY = struct.Struct(">Q")
+MAX_WEIGHT = 0xFFFF
+WINNERS = {"1-0": 'w', "0-1": 'b'}
+
+
+class OpeningBook():
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        size = self.file.seek(0, 2)
+        # an empty file can't be mapped
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.entries = size // ENTRY.size
+
+    '''
+    [(move code, weight)] stored for the position key, in file order
+    '''
+    def lookup(self, key):
+        low, high = 0, self.entries
+        while low < high: # first entry with a key >= key
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        moves = []
+        while low < self.entries:
+            entry_key, move, weight, _ = ENTRY.unpack_from(self.data, low * ENTRY.size)
+            if entry_key != key:
+                break
+            moves.append((move, weight))
+            low += 1
+        return moves
+
+    '''
+    A book move for gs picked at random with the weights as odds, or None if the position isn't in the book
+    '''
+    def choose(self, gs, rng=random):
+        legal = gs.generate_moves([])
+        moves = [(move, weight) for move, weight in self.lookup(gs.zobristKey) if move in legal and weight > 0]
+        if not moves:
+            return None
+        return rng.choices([move for move, _ in moves], weights=[weight for _, weight in moves])[0]
+
+    def close(self):
+        if self.entries:
+            self.data.close()
+        self.file.close()
+
+
+'''
+Count the first plies of every game in the PGN file and write a book. A move's weight is 2 for every game its side
+won and 1 for every draw, so moves that only lost are left out. Moves with fewer than min_games games are dropped.
+Returns the number of entries written
+'''
+def build_book(pgn_path, book_path, plies=16, min_games=1):
+    counts = {}
+    for game in Pgn.read_games(pgn_path, parse_moves=False): # only the first plies are needed
+        gs = game.start_position()
+        winner = WINNERS.get(game.result)
+        for san in game.sans[:plies]:
+            colour = 'w' if gs.white_to_move else 'b'
+            try:
+                move = gs.parse_san(san)
+            except ValueError:
+                break
+            games, weight = counts.get((gs.zobristKey, move), (0, 0))
+            points = 1 if winner is None else 2 if winner == colour else 0
+            counts[(gs.zobristKey, move)] = (games + 1, weight + points)
+            gs.push(move)
+
+    entries = sorted((key, move, weight) for (key, move), (games, weight) in counts.items()
+                     if games >= min_games and weight > 0)
+    scale = max([weight for _, _, weight in entries] + [MAX_WEIGHT]) / MAX_WEIGHT
+    with open(book_path, "wb") as book:
+        for key, move, weight in entries:
+            book.write(ENTRY.pack(key, move, max(1, int(weight / scale)), 0))
+    return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or look into an opening book")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from a PGN file")
+    build.add_argument("pgn")
+    build.add_argument("book")
+    build.add_argument("--plies", type=int, default=16, help="plies of each game to use (default: 16)")
+    build.add_argument("--min-games", type=int, default=1, help="games a move needs to be kept (default: 1)")
+    show = commands.add_parser("show", help="list the book moves for a position")
+    show.add_argument("book")
+    show.add_argument("--fen", help="position to look up (default: the start position)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(build_book(args.pgn, args.book, args.plies, args.min_games), "entries written to", args.book)
+    else:
+        gs = ChessEngine.GameState(args.fen)
+        book = OpeningBook(args.book)
+        moves = book.lookup(gs.zobristKey)
+        total = sum(weight for _, weight in moves)
+        for move, weight in sorted(moves, key=lambda entry: -entry[1]):
+            print(ChessEngine.Move.from_code(move, gs.board).get_chess_notation(), weight,
+                  "{:.1%}".format(weight / total))
+        book.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Perft counts the leaf nodes of the legal move tree to a fixed depth. The counts are checked against the published
+numbers for standard test positions, which catches move generation bugs. Timing the run measures how fast
+generate_moves, push and pop are.
+
+Run from the repository root:
+    python -m Chess.Perft                       whole suite at each position's default depth
+    python -m Chess.Perft --depth 5             whole suite at depth 5 (where the count is known)
+    python -m Chess.Perft --fen "<FEN>" --depth 3 --divide
+"""
+import argparse
+import time
+from Chess import ChessEngine
+
+# name, FEN, published leaf counts for depth 1, 2, ..., default depth for a suite run
+SUITE = [
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [20, 400, 8902, 197281, 4865609, 119060324], 4),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603, 193690690], 3),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624, 11030083], 4),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333, 15833292], 3),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487, 89941194], 3),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594, 164075551], 3),
+]
+
+
+'''
+Number of leaf nodes depth plies below the current position. buffers holds one move list per depth so nothing is
+allocated per node. At depth 1 the moves are counted without being made
+'''
+def perft(gs, depth, buffers):
+    moves = gs.generate_moves(buffers[depth])
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.push(move)
+        nodes += perft(gs, depth - 1, buffers)
+        gs.pop()
+    return nodes
+
+
+'''
+Leaf count below each root move, as (move in coordinate notation, count) sorted by move
+'''
+def divide(gs, depth):
+    buffers = [[] for _ in range(depth + 1)]
+    results = []
+    for move in list(gs.generate_moves(buffers[depth])):
+        gs.push(move)
+        nodes = perft(gs, depth - 1, buffers) if depth > 1 else 1
+        gs.pop()
+        results.append((move_notation(gs, move), nodes))
+    return sorted(results)
+
+
+def move_notation(gs, code):
+    notation = ChessEngine.Move.from_code(code, gs.board).get_chess_notation()
+    if code & ChessEngine.FLAG_MASK == ChessEngine.PROMOTION:
+        notation += ChessEngine.PROMOTION_PIECES[code >> 14].lower()
+    return notation
+
+
+'''
+Run perft on one position, returns (nodes, seconds)
+'''
+def timed_perft(fen, depth):
+    gs = ChessEngine.GameState(fen)
+    buffers = [[] for _ in range(depth + 1)]
+    start = time.perf_counter()
+    nodes = perft(gs, depth, buffers)
+    return nodes, time.perf_counter() - start
+
+
+'''
+Run every suite position and print the count, the published count and the speed. Returns True if all counts match
+'''
+def run_suite(depth=None):
+    all_passed = True
+    total_nodes = 0
+    total_time = 0
+    for name, fen, expected, default_depth in SUITE:
+        run_depth = min(depth or default_depth, len(expected))
+        nodes, seconds = timed_perft(fen, run_depth)
+        passed = nodes == expected[run_depth - 1]
+        all_passed = all_passed and passed
+        total_nodes += nodes
+        total_time += seconds
+        print("{:<11} depth {}  {:>10} nodes  expected {:>10}  {:7.2f}s  {:>8.0f} nodes/s  {}".format(
+            name, run_depth, nodes, expected[run_depth - 1], seconds, nodes / seconds, "ok" if passed else "FAIL"))
+    print("total {} nodes in {:.2f}s, {:.0f} nodes/s".format(total_nodes, total_time, total_nodes / total_time))
+    return all_passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count and time legal move tree leaf nodes")
+    parser.add_argument("--depth", type=int, help="search depth (default: per position in the suite, 3 with --fen)")
+    parser.add_argument("--fen", help="run one position instead of the suite")
+    parser.add_argument("--divide", action="store_true", help="print the count below each root move")
+    args = parser.parse_args()
+
+    if args.fen is None and not args.divide:
+        raise SystemExit(0 if run_suite(args.depth) else 1)
+
+    fen = args.fen or SUITE[0][1]
+    depth = args.depth or 3
+    if args.divide:
+        start = time.perf_counter()
+        results = divide(ChessEngine.GameState(fen), depth)
+        seconds = time.perf_counter() - start
+        for notation, nodes in results:
+            print(notation + ":", nodes)
+        nodes = sum(count for _, count in results)
+    else:
+        nodes, seconds = timed_perft(fen, depth)
+    print("depth {}: {} nodes in {:.2f}s, {:.0f} nodes/s".format(depth, nodes, seconds, nodes / seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Reading and writing PGN game collections. read_games is a generator that reads the file a buffer at a time and holds
+one game in memory, so files of any size can be streamed. Each SAN move is matched against the legal moves of the
+position to get its packed move code. write_games writes games back out, with the SAN worked out from the codes.
+
+Run from the repository root to time parsing:
+    python -m Chess.Pgn games.pgn                  games/s with the moves matched to legal moves
+    python -m Chess.Pgn games.pgn --no-moves       games/s for splitting the file into tags and SAN only
+"""
+import argparse
+import re
+import time
+from Chess import ChessEngine
+
+TAG = re.compile(r'\[\s*(\w+)\s+"(.*)"\s*\]') # up to the last quote, some writers leave quotes in values unescaped
+TOKEN = re.compile(r"[{}();]|[^\s{}();]+")
+MOVE_NUMBER = re.compile(r"^\d+\.+")
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+UNKNOWN_DATE = "????.??.??"
+LINE_LENGTH = 80 # the PGN standard's limit for movetext lines
+
+
+class PgnGame():
+    '''
+    One game. tags are the tag pairs in file order, sans the main line as written, and moves the same moves as
+    packed codes (None if they weren't matched to legal moves). error says why moves stops short of sans, if it does
+    '''
+    def __init__(self, tags=None, sans=None, moves=None, result="*", error=None):
+        self.tags = tags if tags is not None else {}
+        self.sans = sans if sans is not None else []
+        self.moves = moves
+        self.result = result
+        self.error = error
+
+    '''
+    The game so far in gs, which has to have been played from fen (None for the starting position). The result
+    comes from the final position
+    '''
+    @classmethod
+    def from_game_state(cls, gs, tags=None, fen=None):
+        moves = [code for code, _, _ in gs.undoLog]
+        result = "*"
+        if gs.checkmate:
+            result = "0-1" if gs.white_to_move else "1-0"
+        elif gs.stalemate:
+            result = "1/2-1/2"
+        tags = dict(tags or {})
+        if fen is not None:
+            tags.update(SetUp="1", FEN=fen)
+        return cls(tags, moves=moves, result=result)
+
+    '''
+    A GameState at the position the game starts from
+    '''
+    def start_position(self):
+        return ChessEngine.GameState(self.tags.get("FEN"))
+
+
+'''
+Build the PgnGame for what was read, matching the SAN moves to legal moves unless parse_moves is False
+'''
+def finish_game(tags, sans, result, parse_moves):
+    game = PgnGame(tags, sans, result=result or tags.get("Result", "*"))
+    if not parse_moves:
+        return game
+    game.moves = []
+    try:
+        gs = game.start_position()
+    except (ValueError, KeyError, IndexError):
+        game.error = "bad FEN " + tags.get("FEN", "")
+        return game
+    for ply, san in enumerate(sans):
+        try:
+            code = gs.parse_san(san)
+        except ValueError as error:
+            game.error = "ply {}: {}".format(ply + 1, error)
+            break
+        gs.push(code)
+        game.moves.append(code)
+    return game
+
+
+'''
+Yield every game in source (a path or a text file object) as a PgnGame. Only the main line is kept: comments,
+variations, NAGs and move numbers are skipped. With parse_moves=False the moves are left as SAN, which is much
+faster. A path is read through a buffer of buffer_size bytes
+'''
+def read_games(source, parse_moves=True, buffer_size=1 << 20):
+    pgn = open(source, encoding="utf-8", errors="replace", buffering=buffer_size) if isinstance(source, str) \
+        else source
+    try:
+        tags = {}
+        sans = []
+        in_comment = False
+        variations = 0 # nesting of the variation being skipped
+        for line in pgn:
+            if not in_comment and not variations:
+                if line.startswith("["):
+                    if sans: # a game without a result, the next one has started
+                        yield finish_game(tags, sans, None, parse_moves)
+                        tags, sans = {}, []
+                    tag = TAG.match(line)
+                    if tag:
+                        tags[tag.group(1)] = tag.group(2).replace('\\"', '"').replace("\\\\", "\\")
+                    continue
+                if line.startswith("%"): # escaped line
+                    continue
+            for token in TOKEN.findall(line):
+                if in_comment:
+                    in_comment = token != "}"
+                elif token == "{":
+                    in_comment = True
+                elif token == ";": # comment to the end of the line
+                    break
+                elif token == "(":
+                    variations += 1
+                elif token == ")":
+                    variations -= 1
+                elif variations or token[0] == "$":
+                    continue
+                elif token in RESULTS:
+                    yield finish_game(tags, sans, token, parse_moves)
+                    tags, sans = {}, []
+                else:
+                    token = MOVE_NUMBER.sub("", token)
+                    if token and not token.isdigit(): # a move number written without its dot
+                        sans.append(token)
+        if sans or tags:
+            yield finish_game(tags, sans, None, parse_moves)
+    finally:
+        if pgn is not source:
+            pgn.close()
+
+
+'''
+The game as PGN text. The seven tag roster comes first (with "?" for missing tags), then the other tags. SAN is made
+from game.moves if they are there, otherwise game.sans is written as it is
+'''
+def format_game(game):
+    tags = dict(game.tags, Result=game.result)
+    tags.setdefault("Date", UNKNOWN_DATE)
+    lines = ['[{} "{}"]'.format(name, tags.get(name, "?").replace("\\", "\\\\").replace('"', '\\"'))
+             for name in SEVEN_TAG_ROSTER]
+    lines += ['[{} "{}"]'.format(name, value.replace("\\", "\\\\").replace('"', '\\"'))
+              for name, value in tags.items() if name not in SEVEN_TAG_ROSTER]
+    lines.append("")
+
+    sans = game.sans
+    gs = game.start_position()
+    if game.moves is not None:
+        sans = []
+        for code in game.moves:
+            sans.append(gs.san(code))
+            gs.push(code)
+        gs = game.start_position()
+    white_first = gs.white_to_move
+    number = gs.fullmoveNumber
+    words = []
+    for ply, san in enumerate(sans):
+        if (ply % 2 == 0) == white_first:
+            words.append("{}. {}".format(number, san))
+        elif ply == 0:
+            words.append("{}... {}".format(number, san))
+        else:
+            words.append(san)
+        if (ply % 2 == 1) == white_first:
+            number += 1
+    words.append(game.result)
+
+    line = ""
+    for word in words:
+        if line and len(line) + 1 + len(word) > LINE_LENGTH:
+            lines.append(line)
+            line = word
+        else:
+            line = line + " " + word if line else word
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+
+'''
+Write the games to destination, a path or a text file object. A path is appended to, so finished games can be
+added to a collection one at a time
+'''
+def write_games(destination, games):
+    pgn = open(destination, "a", encoding="utf-8") if isinstance(destination, str) else destination
+    try:
+        for game in games:
+            pgn.write(format_game(game))
+    finally:
+        if pgn is not destination:
+            pgn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time reading a PGN file")
+    parser.add_argument("pgn")
+    parser.add_argument("--no-moves", action="store_true", help="don't match the SAN moves to legal moves")
+    args = parser.parse_args()
+
+    games = plies = errors = 0
+    start = time.perf_counter()
+    for game in read_games(args.pgn, parse_moves=not args.no_moves):
+        games += 1
+        plies += len(game.sans)
+        errors += game.error is not None
+    seconds = time.perf_counter() - start
+    print("{} games, {} plies, {} with errors in {:.2f}s: {:.0f} games/s, {:.0f} plies/s".format(
+        games, plies, errors, seconds, games / seconds, plies / seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Searches a fixed set of positions to a fixed depth and prints the nodes and time for each, so search changes can be
+compared. ChessAI settings can be changed for a run.
+
+Run from the repository root:
+    python -m Chess.SearchBench                 every position to depth 4
+    python -m Chess.SearchBench --depth 5 --set USE_PVS=False --set ASPIRATION_WINDOW=0
+    python -m Chess.SearchBench --threads 1,2,4,8  time to depth and nodes/s for each number of search processes
+"""
+import argparse
+import time
+from Chess import ChessEngine, ChessAI
+
+POSITIONS = [
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"),
+    ("italian", "r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w KQkq - 1 5"),
+    ("queens gambit", "r1bq1rk1/pppnbppp/4pn2/3p2B1/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 3 7"),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1"),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10"),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"),
+]
+
+
+'''
+Search every position from a fresh start (empty transposition table and history) and print one line each.
+With threads above 1 the positions are searched with ChessAI.parallel_search. Returns (total nodes, total seconds)
+'''
+def run(depth, threads=1):
+    total_nodes = 0
+    total_time = 0
+    for name, fen in POSITIONS:
+        gs = ChessEngine.GameState(fen)
+        ChessAI.new_game()
+        start = time.perf_counter()
+        if threads > 1:
+            move, score = ChessAI.parallel_search(gs, gs.generate_moves([]), max_depth=depth, threads=threads)
+        else:
+            move, score = ChessAI.search(gs, gs.generate_moves([]), max_depth=depth, verbose=False)
+        seconds = time.perf_counter() - start
+        total_nodes += ChessAI.counter
+        total_time += seconds
+        notation = ChessEngine.Move.from_code(move, gs.board).get_chess_notation()
+        print("{:<14} {:<6} {:>6}  {:>8} nodes  {:6.2f}s".format(name, notation, score, ChessAI.counter, seconds))
+    print("total {} nodes in {:.2f}s, {:.0f} nodes/s".format(total_nodes, total_time, total_nodes / total_time))
+    return total_nodes, total_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search fixed positions to a fixed depth and count nodes")
+    parser.add_argument("--depth", type=int, default=4, help="search depth (default: 4)")
+    parser.add_argument("--threads", default="1",
+                        help="comma separated numbers of search processes to compare, e.g. 1,2,4,8 (default: 1)")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="change a ChessAI setting for this run, e.g. USE_PVS=False")
+    args = parser.parse_args()
+
+    try:
+        ChessAI.apply_settings(ChessAI.parse_settings(args.set))
+    except ValueError as error:
+        parser.error(str(error))
+    thread_counts = [int(threads) for threads in args.threads.split(",")]
+    if len(thread_counts) == 1:
+        run(args.depth, thread_counts[0])
+        ChessAI.shutdown()
+        return
+
+    summary = []
+    for threads in thread_counts:
+        print("threads", threads)
+        summary.append((threads,) + run(args.depth, threads))
+    base_time = summary[0][2]
+    for threads, nodes, seconds in summary:
+        print("{} threads: time to depth {:.2f}s ({:.2f}x), {:.0f} nodes/s".format(
+            threads, seconds, base_time / seconds, nodes / seconds))
+    ChessAI.shutdown()
+
+
+if __name__ == "__main__":
+    main()
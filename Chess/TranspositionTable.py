@@ -0,0 +1,130 @@
+"""
+Transposition table for the AI search. Remembers what was found out about a position, keyed by its Zobrist key,
+so the same position reached through a different move order doesn't have to be searched again.
+"""
+from array import array
+from multiprocessing import shared_memory
+
+EXACT = 0
+LOWER_BOUND = 1 # the search failed high, the real score is at least the stored one
+UPPER_BOUND = 2 # the search failed low, the real score is at most the stored one
+
+NO_MOVE = -1
+# bytes per entry: the key xor the data word 8 + the data word 8
+ENTRY_SIZE = 16
+
+'''
+Layout of the data word. Scores are stored in half points, so they must be multiples of 0.5
+'''
+MOVE_BITS = 17 # move + 1, so NO_MOVE is 0
+SCORE_SHIFT = 17
+SCORE_BITS = 20
+SCORE_OFFSET = 1 << (SCORE_BITS - 1)
+DEPTH_SHIFT = 37
+FLAG_SHIFT = 45
+GENERATION_SHIFT = 47
+
+
+class TranspositionTable():
+    '''
+    Entries are stored in two arrays of 64 bit words sized from the memory cap, so the table never grows past it:
+    a data word packing the depth, score, bound flag, best move and search generation, and the key xor'ed with the
+    data word. Each key maps to a bucket of two slots. The first keeps the deepest result seen for the bucket
+    (depth-preferred), the second always takes the newest result (always-replace).
+
+    With shared=True the words live in shared memory, so search processes can use one table (see attach). There are
+    no locks: a slot written by two processes at once can end up with one's key word and the other's data word, but
+    then the key no longer matches after the xor and probe treats it as empty
+    '''
+    def __init__(self, size_mb=16, shared=False):
+        self.buckets = max(1, size_mb * 1024 * 1024 // (2 * ENTRY_SIZE))
+        self.memory = shared_memory.SharedMemory(create=True, size=2 * ENTRY_SIZE * self.buckets) if shared else None
+        self.owner = shared
+        self.clear()
+
+    '''
+    Use a shared table made in another process, from its handle()
+    '''
+    @classmethod
+    def attach(cls, handle):
+        name, buckets, generation = handle
+        table = cls.__new__(cls)
+        table.buckets = buckets
+        table.memory = shared_memory.SharedMemory(name=name)
+        table.owner = False
+        table.map_memory()
+        table.generation = generation
+        table.probes = 0
+        table.hits = 0
+        return table
+
+    def handle(self):
+        return self.memory.name, self.buckets, self.generation
+
+    def map_memory(self):
+        half = ENTRY_SIZE * self.buckets
+        self.keys = self.memory.buf[:half].cast('Q')
+        self.data = self.memory.buf[half:2 * half].cast('Q')
+
+    def clear(self):
+        if self.memory is None:
+            self.keys = array('Q', bytes(8 * 2 * self.buckets))
+            self.data = array('Q', bytes(8 * 2 * self.buckets))
+        else:
+            self.memory.buf[:2 * ENTRY_SIZE * self.buckets] = bytes(2 * ENTRY_SIZE * self.buckets)
+            self.map_memory()
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    '''
+    Let go of the shared memory. The process that made the table also frees it
+    '''
+    def close(self):
+        if self.memory is None:
+            return
+        self.keys.release()
+        self.data.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+        self.memory = None
+
+    '''
+    Called before every new search. Deep entries left over from older searches can then be replaced in the
+    depth-preferred slot instead of keeping it forever
+    '''
+    def new_search(self):
+        self.generation = (self.generation + 1) % 256
+        self.probes = 0
+        self.hits = 0
+
+    '''
+    Returns (depth, score, flag, move) for the position, or None if it isn't stored
+    '''
+    def probe(self, key):
+        self.probes += 1
+        i = key % self.buckets * 2
+        data = self.data[i]
+        if self.keys[i] ^ data != key:
+            i += 1
+            data = self.data[i]
+            if self.keys[i] ^ data != key:
+                return None
+        self.hits += 1
+        return (data >> DEPTH_SHIFT & 0xFF, ((data >> SCORE_SHIFT & ((1 << SCORE_BITS) - 1)) - SCORE_OFFSET) / 2,
+                data >> FLAG_SHIFT & 3, (data & ((1 << MOVE_BITS) - 1)) - 1)
+
+    def store(self, key, depth, score, flag, move=NO_MOVE):
+        i = key % self.buckets * 2
+        old = self.data[i]
+        if not (self.keys[i] ^ old == key or depth >= old >> DEPTH_SHIFT & 0xFF
+                or old >> GENERATION_SHIFT != self.generation):
+            i += 1 # the depth-preferred slot holds a deeper result of this search, use the always-replace slot
+        data = (move + 1 | (int(score * 2) + SCORE_OFFSET) << SCORE_SHIFT | depth << DEPTH_SHIFT
+                | flag << FLAG_SHIFT | self.generation << GENERATION_SHIFT)
+        self.data[i] = data
+        self.keys[i] = key ^ data
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
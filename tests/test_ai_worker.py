@@ -0,0 +1,53 @@
+import time
+from Chess import ChessEngine, ChessAI
+from Chess.AIWorker import AIWorker
+
+
+def wait_for_result(worker, timeout=30):
+    end = time.perf_counter() + timeout
+    while time.perf_counter() < end:
+        result = worker.get_result()
+        if result is not None:
+            return result
+        assert worker.process.is_alive(), "AI process died with exit code {}".format(worker.process.exitcode)
+        time.sleep(0.05)
+    raise AssertionError("no move from the AI process")
+
+
+def test_parallel_search_in_worker(monkeypatch):
+    # the worker is forked with these settings, so its search starts parallel_search processes of its own
+    monkeypatch.setattr(ChessAI, "THREADS", 2)
+    monkeypatch.setattr(ChessAI, "USE_BOOK", False)
+    worker = AIWorker()
+    try:
+        worker.set_position(None, [])
+        worker.go(move_time=0.5)
+        move, _ = wait_for_result(worker)
+        assert move in ChessEngine.GameState().generate_moves([])
+    finally:
+        worker.close()
+    assert worker.process.exitcode == 0
+
+
+def test_position_after_a_ponder_miss(monkeypatch):
+    monkeypatch.setattr(ChessAI, "USE_BOOK", False)
+    gs = ChessEngine.GameState()
+    pondered = []
+    for san in ("e4", "e5", "Nf3"):
+        pondered.append(gs.parse_san(san))
+        gs.push(pondered[-1])
+    gs = ChessEngine.GameState()
+    played = []
+    for san in ("e4", "c5"):
+        played.append(gs.parse_san(san))
+        gs.push(played[-1])
+    worker = AIWorker()
+    try:
+        # the worker takes back to e4 and plays c5, leaving white to move
+        worker.set_position(None, pondered)
+        worker.set_position(None, played)
+        worker.go(move_time=0.2)
+        move, _ = wait_for_result(worker)
+        assert move in gs.generate_moves([])
+    finally:
+        worker.close()
@@ -0,0 +1,30 @@
+import random
+from Chess import ChessAI
+from Chess.ChessEngine import GameState
+
+POSITIONS = [
+    None,
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1",
+    "rnbqkbnr/pp2p1pp/8/2ppPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 4",
+]
+
+
+def test_running_score_over_random_games():
+    rng = random.Random(2)
+    for game in range(40):
+        gs = GameState(POSITIONS[game % len(POSITIONS)])
+        gs.set_score_table(ChessAI.score_table)
+        assert gs.boardScore == ChessAI.score_board_full(gs)
+        for ply in range(80):
+            moves = gs.generate_moves([])
+            if not moves:
+                break
+            gs.push(rng.choice(moves))
+            assert gs.boardScore == ChessAI.score_board_full(gs)
+            if rng.random() < 0.2:
+                gs.pop()
+                assert gs.boardScore == ChessAI.score_board_full(gs)
+        while gs.undoLog:
+            gs.pop()
+            assert gs.boardScore == ChessAI.score_board_full(gs)
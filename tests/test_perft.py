@@ -0,0 +1,16 @@
+import pytest
+from Chess import ChessEngine
+from Chess.Perft import SUITE, perft
+
+DEPTH = 3
+
+
+@pytest.mark.parametrize("name, fen, counts", [(name, fen, counts) for name, fen, counts, _ in SUITE])
+def test_perft(name, fen, counts):
+    gs = ChessEngine.GameState(fen)
+    key = gs.zobristKey
+    for depth in range(1, DEPTH + 1):
+        assert perft(gs, depth, [[] for _ in range(depth + 1)]) == counts[depth - 1]
+    # every move was taken back
+    assert gs.zobristKey == key
+    assert gs.to_fen() == fen
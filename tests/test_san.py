@@ -0,0 +1,61 @@
+import pytest
+from Chess.ChessEngine import GameState, SQUARE_NAMES, PROMOTION, FLAG_MASK, PROMOTION_PIECES
+
+# FEN, [(move in coordinate notation, its SAN)]
+CASES = [
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", [("e2e4", "e4"), ("g1f3", "Nf3")]),
+    # disambiguation by file, by rank and by both
+    ("4k3/8/8/8/8/8/8/1N2KN2 w - - 0 1", [("b1d2", "Nbd2"), ("f1d2", "Nfd2")]),
+    ("4k3/8/8/R7/8/8/8/R3K3 w - - 0 1", [("a1a3", "R1a3"), ("a5a3", "R5a3"), ("a1a4", "R1a4")]),
+    ("7k/8/8/8/2Q1Q3/8/4Q3/7K w - - 0 1", [("e4d3", "Qe4d3"), ("e2d3", "Q2d3"), ("c4d3", "Qcd3")]),
+    # promotions, with captures and checks
+    ("n1n5/PPPk4/8/8/8/8/4Kppp/5N1N w - - 0 1",
+     [("b7a8q", "bxa8=Q"), ("b7c8n", "bxc8=N"), ("b7b8q", "b8=Q"), ("b7b8r", "b8=R")]),
+    ("n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1", [("g2h1q", "gxh1=Q"), ("g2f1q", "gxf1=Q+"), ("g2g1n", "g1=N+")]),
+    # check and mate
+    ("4k3/8/8/8/8/8/8/R3K3 w - - 0 1", [("a1a8", "Ra8+")]),
+    ("6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1", [("d1d8", "Rd8#")]),
+    ("6rk/6pp/8/6N1/8/8/8/7K w - - 0 1", [("g5f7", "Nf7#")]),
+    # en passant and castling
+    ("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3", [("e5d6", "exd6"), ("e5e6", "e6")]),
+    ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [("e1g1", "O-O"), ("e1c1", "O-O-O"), ("e5g6", "Nxg6"), ("d5e6", "dxe6"), ("f3f6", "Qxf6")]),
+    ("r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1", [("e8c8", "O-O-O"), ("e8g8", "O-O"), ("a8a1", "Rxa1+")]),
+]
+
+
+def coordinates(code):
+    notation = SQUARE_NAMES[code & 63] + SQUARE_NAMES[code >> 6 & 63]
+    if code & FLAG_MASK == PROMOTION:
+        notation += PROMOTION_PIECES[code >> 14].lower()
+    return notation
+
+
+@pytest.mark.parametrize("fen, moves", CASES)
+def test_san(fen, moves):
+    gs = GameState(fen)
+    by_coordinates = {coordinates(code): code for code in gs.generate_moves([])}
+    for notation, san in moves:
+        assert gs.san(by_coordinates[notation]) == san
+        assert gs.parse_san(san) == by_coordinates[notation]
+
+
+@pytest.mark.parametrize("fen", [fen for fen, _ in CASES])
+def test_every_move_round_trips(fen):
+    gs = GameState(fen)
+    key = gs.zobristKey
+    codes = list(gs.generate_moves([]))
+    sans = [gs.san(code) for code in codes]
+    assert len(set(sans)) == len(sans)
+    for code, san in zip(codes, sans):
+        assert gs.parse_san(san) == code
+        assert gs.parse_san(san.rstrip("+#")) == code # check marks are optional when reading
+    assert gs.zobristKey == key
+
+
+def test_parse_san_rejects_illegal_and_ambiguous_moves():
+    gs = GameState("4k3/8/8/8/8/8/8/1N2KN2 w - - 0 1")
+    with pytest.raises(ValueError):
+        gs.parse_san("Nd2") # either knight
+    with pytest.raises(ValueError):
+        gs.parse_san("Nc4")
@@ -0,0 +1,64 @@
+import random
+from Chess.ChessEngine import GameState, Move, FLAG_MASK, EN_PASSANT, CASTLE, PROMOTION
+
+POSITIONS = [
+    None,
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", # castling both ways, en passant
+    "n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1", # promotions, with and without a capture
+    "rnbqkbnr/pp2p1pp/8/2ppPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 4", # en passant straight away
+]
+
+
+def check(gs):
+    assert gs.zobristKey == gs.compute_zobrist_key()
+
+
+def test_incremental_key_over_random_games():
+    rng = random.Random(1)
+    seen = set()
+    for game in range(60):
+        gs = GameState(POSITIONS[game % len(POSITIONS)])
+        check(gs)
+        for ply in range(80):
+            moves = gs.get_valid_moves()
+            if not moves:
+                break
+            move = rng.choice(moves)
+            flag = move.code & FLAG_MASK
+            seen.add({EN_PASSANT: "en passant", CASTLE: "castle", PROMOTION: "promotion"}.get(flag, "normal"))
+            gs.make_move(move)
+            check(gs)
+            if rng.random() < 0.2: # take it back and play it again
+                gs.undo_move()
+                check(gs)
+                gs.make_move(Move.from_code(move.code, gs.board))
+                check(gs)
+            if not gs.in_check() and rng.random() < 0.2:
+                seen.add("null")
+                gs.push_null()
+                check(gs)
+                gs.pop()
+                check(gs)
+        while gs.moveLog:
+            gs.undo_move()
+            check(gs)
+        assert gs.zobristKey == GameState(POSITIONS[game % len(POSITIONS)]).zobristKey
+    assert seen == {"normal", "en passant", "castle", "promotion", "null"}
+
+
+def test_same_position_same_key():
+    # the same position reached by two move orders
+    first, second = GameState(), GameState()
+    for san in ("Nf3", "Nf6", "Nc3", "Nc6"):
+        first.push(first.parse_san(san))
+    for san in ("Nc3", "Nc6", "Nf3", "Nf6"):
+        second.push(second.parse_san(san))
+    assert first.zobristKey == second.zobristKey
+    # only the en passant square differs
+    gs = GameState()
+    for san in ("e4", "Nf6", "e5", "d5"):
+        gs.push(gs.parse_san(san))
+    fen = gs.to_fen()
+    assert fen.split()[3] == "d6"
+    assert gs.zobristKey == GameState(fen).zobristKey
+    assert gs.zobristKey != GameState(fen.replace(" d6 ", " - ")).zobristKey